@@ -1,42 +1,1569 @@
-from flask import Flask, render_template, request, redirect, url_for, session, g, flash
+from flask import (
+    Flask, render_template, request, redirect, url_for, session, g, flash,
+    Response, abort, has_request_context,
+)
 import sqlite3
 from functools import wraps
+import base64
+import bisect
+import csv
+import hashlib
+import io
+import json
+import logging
 import math
+import os
+import pathlib
+import random
+import re
+import shutil
+import tempfile
+import threading
+import time
+from collections import deque
+from datetime import date, timedelta
+from logging.handlers import RotatingFileHandler
+from concurrent.futures import ThreadPoolExecutor
+import click
+from jinja2 import FileSystemBytecodeCache
+from markupsafe import Markup
 
 DATABASE = "database.db"
 
 app = Flask(__name__)
 app.secret_key = "dev-secret-key"  # change for production
 
+app.config.update(
+    # Applied to every new SQLite connection, in this order
+    SQLITE_PRAGMAS={
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "cache_size": -32000,       # KiB (negative) -> ~32 MB page cache
+        "mmap_size": 268435456,     # 256 MB
+        "temp_store": "MEMORY",
+        "busy_timeout": 5000,       # ms
+        "foreign_keys": "ON",
+    },
+    # Idle connections kept per database file
+    SQLITE_POOL_SIZE=8,
+    # Seconds before admin dashboard figures are reloaded even without a write
+    DASHBOARD_CACHE_TTL=60,
+    STUDENTS_PER_PAGE=10,
+    APPLICATIONS_PER_PAGE=50,
+    SEARCH_RESULT_LIMIT=50,
+    # Guard rails for the admin SQL console
+    SQL_CONSOLE_TIME_LIMIT=5.0,   # seconds before a query is interrupted
+    SQL_CONSOLE_MAX_ROWS=1000,
+    # Exports stream without a row cap, so they get a longer budget
+    SQL_EXPORT_TIME_LIMIT=600.0,
+    EXPORT_BATCH_SIZE=1000,
+    # Rows per transaction for bulk CSV imports
+    IMPORT_CHUNK_SIZE=1000,
+    # Per-request SQL timing shown on /admin/perf; when off, connections
+    # are handed out unwrapped
+    SQL_PROFILING=False,
+    SQL_PROFILE_HISTORY=500,      # requests kept for the perf page
+    SQL_PROFILE_TOP_STATEMENTS=5,
+    # Statements slower than this (ms) are logged with their query plan;
+    # None (the default) leaves the slow-query log off
+    SLOW_QUERY_MS=None,
+    SLOW_QUERY_LOG="slow_queries.log",
+    SLOW_QUERY_LOG_BYTES=5 * 1024 * 1024,
+    SLOW_QUERY_LOG_BACKUPS=3,
+    # A fingerprint already logged is only logged again after this many seconds
+    SLOW_QUERY_DEDUP_SECONDS=300,
+    # Prometheus /metrics; with a token set, scrapes must send it as a Bearer token
+    METRICS_ENABLED=True,
+    METRICS_TOKEN=None,
+    METRICS_LATENCY_BUCKETS=[0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0],
+    METRICS_DB_BUCKETS=[0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0],
+    # Compiled templates are kept on disk across restarts; None for the
+    # directory means Jinja's per-user temp directory
+    JINJA_BYTECODE_CACHE=True,
+    JINJA_BYTECODE_DIR=None,
+)
+# Any of the above can be overridden from the environment, e.g.
+# FLASK_SQL_PROFILING=true flask --app app run
+app.config.from_prefixed_env()
+
+# Must be in place before app.jinja_env is first used
+if app.config["JINJA_BYTECODE_CACHE"]:
+    if app.config["JINJA_BYTECODE_DIR"]:
+        os.makedirs(app.config["JINJA_BYTECODE_DIR"], exist_ok=True)
+    app.jinja_options = {
+        **app.jinja_options,
+        "bytecode_cache": FileSystemBytecodeCache(app.config["JINJA_BYTECODE_DIR"]),
+    }
+
 # DATABASE HELPERS
 
+# Connections are reused across requests: a request checks one out in get_db
+# and close_db hands it back. Each connection is only ever used by one request
+# at a time, so check_same_thread can be relaxed.
+_pool_lock = threading.Lock()
+_pools = {}
+_pool_stats = {"checkouts": 0, "hits": 0, "misses": 0, "discarded": 0}
+
+def open_connection(path=None):
+    """
+    Open a new connection with the configured pragma profile applied.
+    """
+    db = sqlite3.connect(path or DATABASE, check_same_thread=False)
+    db.row_factory = sqlite3.Row
+    for name, value in app.config["SQLITE_PRAGMAS"].items():
+        db.execute(f"PRAGMA {name} = {value}")
+    return db
+
+def checkout_connection(path):
+    with _pool_lock:
+        _pool_stats["checkouts"] += 1
+        idle = _pools.get(path)
+        if idle:
+            _pool_stats["hits"] += 1
+            return idle.pop()
+        _pool_stats["misses"] += 1
+    return open_connection(path)
+
+def release_connection(db, path):
+    # Never hand a half-finished transaction to the next request
+    if db.in_transaction:
+        db.rollback()
+
+    with _pool_lock:
+        idle = _pools.setdefault(path, [])
+        if len(idle) < app.config["SQLITE_POOL_SIZE"]:
+            idle.append(db)
+            return
+        _pool_stats["discarded"] += 1
+    db.close()
+
+def open_readonly_connection(path=None):
+    """
+    Connection for ad-hoc queries. Opened with mode=ro and query_only,
+    so nothing run on it can modify the database.
+    """
+    uri = pathlib.Path(os.path.abspath(path or DATABASE)).as_uri() + "?mode=ro"
+    db = sqlite3.connect(uri, uri=True, check_same_thread=False)
+    db.row_factory = sqlite3.Row
+    db.execute("PRAGMA query_only = ON")
+    db.execute(f"PRAGMA busy_timeout = {app.config['SQLITE_PRAGMAS']['busy_timeout']}")
+    return db
+
+def set_time_budget(db, seconds):
+    """
+    Interrupt any statement on db that is still running after `seconds`.
+    SQLite then raises OperationalError('interrupted').
+    """
+    deadline = time.perf_counter() + seconds
+    db.set_progress_handler(lambda: time.perf_counter() > deadline, 10000)
+
+def pool_stats():
+    """
+    Snapshot of connection reuse counters plus the current idle count.
+    """
+    with _pool_lock:
+        stats = dict(_pool_stats)
+        stats["idle"] = sum(len(idle) for idle in _pools.values())
+    stats["hit_rate"] = stats["hits"] / stats["checkouts"] if stats["checkouts"] else 0.0
+    return stats
+
 def get_db():
     if "db" not in g:
-        g.db = sqlite3.connect(DATABASE)
-        g.db.row_factory = sqlite3.Row
+        g.db_path = DATABASE
+        g.db = checkout_connection(g.db_path)
+        ensure_migrated(g.db)
+        if app.config["SQL_PROFILING"] or app.config["SLOW_QUERY_MS"] is not None:
+            g.db = ProfiledConnection(g.db)
     return g.db
 
 @app.teardown_appcontext
 def close_db(error):
     db = g.pop("db", None)
     if db:
-        db.close()
+        if isinstance(db, ProfiledConnection):
+            db = db.raw
+        release_connection(db, g.pop("db_path", DATABASE))
+
+# QUERY PROFILING
+# With SQL_PROFILING on or a SLOW_QUERY_MS threshold set, get_db wraps the
+# request's connection so every statement is timed (execute plus fetching its
+# rows). Profiled requests go into a bounded ring buffer that /admin/perf
+# summarizes; statements over the threshold go to the slow-query log.
+# Statements are tallied by their raw text and only normalized when a request
+# is recorded or a statement is logged, never per execute.
+
+_profile_lock = threading.Lock()
+_profile_log = deque(maxlen=app.config["SQL_PROFILE_HISTORY"])
+
+_SQL_STRING = re.compile(r"'(?:[^']|'')*'")
+_SQL_NUMBER = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?\b")
+_SQL_PARAM_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+
+def normalize_sql(sql):
+    """
+    Statement text with literals replaced by ? and IN (?, ?, ...) lists of any
+    length collapsed, so the same query always normalizes the same way.
+    """
+    sql = _SQL_STRING.sub("?", sql)
+    sql = _SQL_NUMBER.sub("?", sql)
+    sql = " ".join(sql.split())
+    return _SQL_PARAM_LIST.sub("(?, ...)", sql)
 
-# SCHEDULE / CONFLICT HELPERS
-DAY_ORDER = {"M": 1, "T": 2, "W": 3, "Th": 4, "F": 5}
+def param_shape(params):
+    """
+    Types of the bound parameters, e.g. ['int', 'str'] or ['int x500'].
+    """
+    if isinstance(params, dict):
+        return {name: type(value).__name__ for name, value in params.items()}
+    shape = []
+    for value in params:
+        name = type(value).__name__
+        if shape and shape[-1][0] == name:
+            shape[-1][1] += 1
+        else:
+            shape.append([name, 1])
+    return [name if n == 1 else f"{name} x{n}" for name, n in shape]
+
+class ProfiledCursor:
+    """Cursor wrapper that charges execute and fetch time to the statement."""
+
+    def __init__(self, conn, cursor):
+        self._conn = conn
+        self._cursor = cursor
+        self._sql = None
+        self._params = None
+        self._elapsed = 0.0
+        self._logged = False
+
+    def _start(self, sql, params):
+        self._sql = sql
+        self._params = params
+        self._elapsed = 0.0
+        self._logged = False
+
+    def _timed(self, sql, fn, *args, count=False):
+        start = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            elapsed = time.perf_counter() - start
+            self._conn.charge(sql, elapsed, count=count)
+            self._elapsed += elapsed
+            threshold = self._conn.slow_threshold
+            if threshold is not None and not self._logged and self._elapsed >= threshold:
+                self._logged = True
+                log_slow_query(self._conn.raw, sql, self._params, self._elapsed)
+
+    def execute(self, sql, params=()):
+        self._start(sql, params)
+        self._timed(sql, self._cursor.execute, sql, params, count=True)
+        return self
+
+    def executemany(self, sql, seq):
+        # Rows may come from a generator, so there's no single parameter set to show
+        self._start(sql, None)
+        self._timed(sql, self._cursor.executemany, sql, seq, count=True)
+        return self
+
+    def fetchone(self):
+        return self._timed(self._sql, self._cursor.fetchone)
+
+    def fetchmany(self, size=None):
+        if size is None:
+            size = self._cursor.arraysize
+        return self._timed(self._sql, self._cursor.fetchmany, size)
+
+    def fetchall(self):
+        return self._timed(self._sql, self._cursor.fetchall)
+
+    def __iter__(self):
+        # Rows pulled by iteration aren't timed; wrapping every step costs
+        # more than the step itself
+        return iter(self._cursor)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+class ProfiledConnection:
+    """Connection wrapper that times every statement issued through it."""
+
+    def __init__(self, raw):
+        self.raw = raw
+        slow_ms = app.config["SLOW_QUERY_MS"]
+        self.slow_threshold = None if slow_ms is None else slow_ms / 1000.0
+        self.profiling = app.config["SQL_PROFILING"]
+        self.queries = 0
+        self.db_time = 0.0
+        self.statements = {}  # sql text -> [calls, seconds]
+        self.started = time.perf_counter()
+
+    def charge(self, sql, seconds, count=True):
+        self.db_time += seconds
+        if count:
+            self.queries += 1
+        # Per-statement tallies are only wanted for /admin/perf
+        if not self.profiling:
+            return
+        entry = self.statements.get(sql)
+        if entry is None:
+            entry = self.statements[sql] = [0, 0.0]
+        entry[1] += seconds
+        if count:
+            entry[0] += 1
+
+    def cursor(self):
+        return ProfiledCursor(self, self.raw.cursor())
+
+    def execute(self, sql, params=()):
+        return self.cursor().execute(sql, params)
+
+    def executemany(self, sql, seq):
+        return self.cursor().executemany(sql, seq)
+
+    def executescript(self, script):
+        start = time.perf_counter()
+        try:
+            return self.raw.executescript(script)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.charge(script, elapsed)
+            if self.slow_threshold is not None and elapsed >= self.slow_threshold:
+                log_slow_query(self.raw, script, None, elapsed, explain=False)
+
+    def __getattr__(self, name):
+        return getattr(self.raw, name)
+
+@app.teardown_request
+def record_request_profile(error):
+    db = g.get("db")
+    if not app.config["SQL_PROFILING"] or not isinstance(db, ProfiledConnection):
+        return
+    statements = {}
+    for sql, (calls, seconds) in db.statements.items():
+        entry = statements.setdefault(normalize_sql(sql), [0, 0.0])
+        entry[0] += calls
+        entry[1] += seconds
+    top = sorted(statements.items(), key=lambda item: item[1][1], reverse=True)
+    entry = {
+        "at": time.time(),
+        "endpoint": request.endpoint or "(unknown)",
+        "method": request.method,
+        "path": request.full_path.rstrip("?"),
+        "queries": db.queries,
+        "db_time": db.db_time,
+        "elapsed": time.perf_counter() - db.started,
+        "statements": [
+            (sql, calls, seconds)
+            for sql, (calls, seconds) in top[:app.config["SQL_PROFILE_TOP_STATEMENTS"]]
+        ],
+    }
+    with _profile_lock:
+        _profile_log.append(entry)
+
+def profile_summary():
+    """
+    Per-endpoint totals over the ring buffer, busiest (by DB time) first,
+    plus the most recent requests.
+    """
+    with _profile_lock:
+        entries = list(_profile_log)
+
+    routes = {}
+    for e in entries:
+        r = routes.setdefault(e["endpoint"], {
+            "endpoint": e["endpoint"], "requests": 0, "queries": 0, "max_queries": 0,
+            "db_time": 0.0, "max_db_time": 0.0, "elapsed": 0.0, "statements": {},
+        })
+        r["requests"] += 1
+        r["queries"] += e["queries"]
+        r["max_queries"] = max(r["max_queries"], e["queries"])
+        r["db_time"] += e["db_time"]
+        r["max_db_time"] = max(r["max_db_time"], e["db_time"])
+        r["elapsed"] += e["elapsed"]
+        for sql, calls, seconds in e["statements"]:
+            stmt = r["statements"].setdefault(sql, [0, 0.0, 0.0])
+            stmt[0] += calls
+            stmt[1] += seconds
+            stmt[2] = max(stmt[2], seconds)
+
+    top_n = app.config["SQL_PROFILE_TOP_STATEMENTS"]
+    for r in routes.values():
+        r["avg_queries"] = r["queries"] / r["requests"]
+        r["avg_db_time"] = r["db_time"] / r["requests"]
+        r["avg_elapsed"] = r["elapsed"] / r["requests"]
+        r["statements"] = sorted(
+            ((sql, calls, total, worst) for sql, (calls, total, worst) in r["statements"].items()),
+            key=lambda stmt: stmt[2], reverse=True,
+        )[:top_n]
+
+    return {
+        "routes": sorted(routes.values(), key=lambda r: r["db_time"], reverse=True),
+        "recent": entries[-50:][::-1],
+        "captured": len(entries),
+    }
+
+def clear_profile_log():
+    with _profile_lock:
+        _profile_log.clear()
+
+# Slow-query log: one JSON object per line in a size-rotated file. Repeats of a
+# fingerprint within SLOW_QUERY_DEDUP_SECONDS are only counted, and the count
+# is written with the next entry for it.
+_slow_lock = threading.Lock()
+_slow_queries = {}  # fingerprint -> stats shown on /admin/perf
+_slow_logger = logging.getLogger("slow_queries")
+
+def _slow_query_logger():
+    with _slow_lock:
+        if not _slow_logger.handlers:
+            handler = RotatingFileHandler(
+                app.config["SLOW_QUERY_LOG"],
+                maxBytes=app.config["SLOW_QUERY_LOG_BYTES"],
+                backupCount=app.config["SLOW_QUERY_LOG_BACKUPS"],
+                encoding="utf-8",
+            )
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            _slow_logger.addHandler(handler)
+            _slow_logger.setLevel(logging.INFO)
+            _slow_logger.propagate = False
+    return _slow_logger
+
+def query_fingerprint(normalized):
+    return hashlib.sha1(normalized.encode("utf-8")).hexdigest()[:16]
+
+def log_slow_query(db, sql, params, elapsed, explain=True):
+    normalized = normalize_sql(sql)
+    fingerprint = query_fingerprint(normalized)
+    now = time.time()
+
+    with _slow_lock:
+        stats = _slow_queries.setdefault(fingerprint, {
+            "fingerprint": fingerprint, "sql": normalized, "count": 0,
+            "max_elapsed": 0.0, "logged_at": None, "suppressed": 0,
+        })
+        stats["count"] += 1
+        stats["max_elapsed"] = max(stats["max_elapsed"], elapsed)
+        stats["last_seen"] = now
+        if (stats["logged_at"] is not None
+                and now - stats["logged_at"] < app.config["SLOW_QUERY_DEDUP_SECONDS"]):
+            stats["suppressed"] += 1
+            return
+        repeats, stats["suppressed"], stats["logged_at"] = stats["suppressed"], 0, now
+
+    plan = None
+    if explain and params is not None:
+        try:
+            plan = explain_plan(db, sql, params)
+        except sqlite3.Error as e:
+            plan = [f"(no plan: {e})"]
+
+    entry = {
+        "ts": time.strftime("%Y-%m-%dT%H:%M:%S%z", time.localtime(now)),
+        "fingerprint": fingerprint,
+        "elapsed_ms": round(elapsed * 1000, 3),
+        "sql": normalized,
+        "params": param_shape(params) if params is not None else None,
+        "plan": plan,
+        "repeats_suppressed": repeats,
+    }
+    if has_request_context():
+        entry.update(route=request.endpoint, method=request.method, path=request.path)
+    _slow_query_logger().info(json.dumps(entry))
+
+def slow_query_summary():
+    with _slow_lock:
+        rows = [dict(stats) for stats in _slow_queries.values()]
+    return sorted(rows, key=lambda r: r["max_elapsed"], reverse=True)
+
+# METRICS
+# Prometheus text format at /metrics. Every thread records into its own shard
+# without taking a lock; a scrape merges the shards. The dev server runs each
+# request on a fresh thread, so shards of finished threads are folded into
+# one retired total whenever a new thread registers.
+
+HISTOGRAMS = {
+    "http_request_duration_seconds": ("Request latency by Flask endpoint.", "METRICS_LATENCY_BUCKETS"),
+    "http_request_db_seconds": (
+        "Time spent in SQLite per request. Only recorded while SQL_PROFILING "
+        "or SLOW_QUERY_MS is set, since connections are not timed otherwise.",
+        "METRICS_DB_BUCKETS",
+    ),
+}
+COUNTERS = {
+    "http_requests_total": "Finished requests by endpoint and status.",
+    "http_requests_started_total": "Requests started.",
+    "sqlite_busy_retries_total": "Retries after SQLITE_BUSY/LOCKED.",
+    "sqlite_busy_failures_total": "Operations abandoned after SQLITE_BUSY/LOCKED.",
+}
+
+def _new_metric_shard():
+    return {"histograms": {}, "counters": {}}
+
+_metrics_lock = threading.Lock()
+_metrics_local = threading.local()
+_metric_shards = []  # (thread, shard) for threads that have recorded something
+_retired_metrics = _new_metric_shard()
+
+def _merge_metric_shard(into, shard):
+    for key, values in list(shard["histograms"].items()):
+        target = into["histograms"].setdefault(key, [0] * len(values))
+        for i, value in enumerate(values):
+            target[i] += value
+    for key, value in list(shard["counters"].items()):
+        into["counters"][key] = into["counters"].get(key, 0) + value
+
+def _metric_shard():
+    shard = getattr(_metrics_local, "shard", None)
+    if shard is None:
+        shard = _metrics_local.shard = _new_metric_shard()
+        with _metrics_lock:
+            live = []
+            for thread, other in _metric_shards:
+                if thread.is_alive():
+                    live.append((thread, other))
+                else:
+                    _merge_metric_shard(_retired_metrics, other)
+            live.append((threading.current_thread(), shard))
+            _metric_shards[:] = live
+    return shard
+
+def observe(name, value, **labels):
+    """
+    Add one observation to a histogram. Bucket counts are kept per bucket
+    (not cumulative) plus the running sum; the scrape accumulates them.
+    """
+    buckets = app.config[HISTOGRAMS[name][1]]
+    histograms = _metric_shard()["histograms"]
+    key = (name, tuple(labels.items()))
+    counts = histograms.get(key)
+    if counts is None:
+        counts = histograms[key] = [0] * (len(buckets) + 2)
+    counts[bisect.bisect_left(buckets, value)] += 1
+    counts[-1] += value
+
+def inc_counter(name, amount=1, **labels):
+    counters = _metric_shard()["counters"]
+    key = (name, tuple(labels.items()))
+    counters[key] = counters.get(key, 0) + amount
+
+@app.before_request
+def _start_request_metrics():
+    if app.config["METRICS_ENABLED"]:
+        g.metrics_started = time.perf_counter()
+        inc_counter("http_requests_started_total")
+
+@app.after_request
+def _note_response_status(response):
+    g.metrics_status = response.status_code
+    return response
+
+@app.teardown_request
+def _finish_request_metrics(error):
+    started = g.get("metrics_started")
+    if started is None:
+        return
+    endpoint = request.endpoint or "(unmatched)"
+    status = g.get("metrics_status", 500)
+    observe("http_request_duration_seconds", time.perf_counter() - started,
+            endpoint=endpoint, method=request.method)
+    inc_counter("http_requests_total", endpoint=endpoint, method=request.method,
+                status=str(status))
+    # Unwrapped connections aren't timed, so there is no DB time to report
+    db = g.get("db")
+    if isinstance(db, ProfiledConnection):
+        observe("http_request_db_seconds", db.db_time, endpoint=endpoint)
+
+def _metric_labels(labels):
+    if not labels:
+        return ""
+    escaped = (
+        (k, str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for k, v in labels
+    )
+    return "{" + ",".join(f'{k}="{v}"' for k, v in escaped) + "}"
+
+def render_metrics():
+    merged = _new_metric_shard()
+    with _metrics_lock:
+        _merge_metric_shard(merged, _retired_metrics)
+        shards = [shard for _, shard in _metric_shards]
+    for shard in shards:
+        _merge_metric_shard(merged, shard)
+
+    lines = []
+    for name, (help_text, buckets_key) in HISTOGRAMS.items():
+        buckets = app.config[buckets_key]
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+        for (metric, labels), counts in sorted(merged["histograms"].items()):
+            if metric != name:
+                continue
+            running = 0
+            for bound, count in zip(buckets + ["+Inf"], counts[:-1]):
+                running += count
+                lines.append(f"{name}_bucket{_metric_labels(labels + (('le', bound),))} {running}")
+            lines.append(f"{name}_sum{_metric_labels(labels)} {counts[-1]}")
+            lines.append(f"{name}_count{_metric_labels(labels)} {running}")
+
+    for name, help_text in COUNTERS.items():
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+        for (metric, labels), value in sorted(merged["counters"].items()):
+            if metric == name:
+                lines.append(f"{name}{_metric_labels(labels)} {value}")
+
+    started = sum(v for (m, _), v in merged["counters"].items() if m == "http_requests_started_total")
+    finished = sum(v for (m, _), v in merged["counters"].items() if m == "http_requests_total")
+    lines += [
+        "# HELP http_requests_in_flight Requests currently being handled.",
+        "# TYPE http_requests_in_flight gauge",
+        f"http_requests_in_flight {started - finished}",
+    ]
+
+    caches = cache_stats()
+    lines += ["# HELP app_cache_hits_total In-process cache hits.", "# TYPE app_cache_hits_total counter"]
+    lines += [f'app_cache_hits_total{{cache="{n}"}} {c["hits"]}' for n, c in sorted(caches.items())]
+    lines += ["# HELP app_cache_misses_total In-process cache misses.", "# TYPE app_cache_misses_total counter"]
+    lines += [f'app_cache_misses_total{{cache="{n}"}} {c["misses"]}' for n, c in sorted(caches.items())]
+    lines += ["# HELP app_cache_hit_ratio Hits / lookups per cache.", "# TYPE app_cache_hit_ratio gauge"]
+    lines += [
+        f'app_cache_hit_ratio{{cache="{n}"}} {c["hits"] / ((c["hits"] + c["misses"]) or 1)}'
+        for n, c in sorted(caches.items())
+    ]
+
+    pool = pool_stats()
+    for key in ("checkouts", "hits", "misses", "discarded"):
+        lines += [f"# TYPE sqlite_pool_{key}_total counter", f"sqlite_pool_{key}_total {pool[key]}"]
+    lines += [
+        "# TYPE sqlite_pool_idle_connections gauge", f"sqlite_pool_idle_connections {pool['idle']}",
+        "# TYPE sqlite_pool_hit_ratio gauge", f"sqlite_pool_hit_ratio {pool['hit_rate']}",
+    ]
+    return "\n".join(lines) + "\n"
+
+@app.route("/metrics")
+def metrics():
+    if not app.config["METRICS_ENABLED"]:
+        abort(404)
+    token = app.config["METRICS_TOKEN"]
+    if token and request.headers.get("Authorization") != f"Bearer {token}":
+        abort(401)
+    return Response(render_metrics(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+# SCHEMA MIGRATIONS
+# schema.sql is the baseline (version 0). Everything after it is a numbered
+# migration applied in order and recorded in schema_version, so a live
+# database.db can be upgraded in place without losing data.
+SCHEMA_FILE = "schema.sql"
+
+def _table_version_sql(*tables, update_of=None):
+    """
+    SQL that registers tables in TableVersion and bumps their counter on every write.
+    With update_of, only updates to those columns count.
+    """
+    update = "UPDATE OF " + ", ".join(update_of) if update_of else "UPDATE"
+    sql = []
+    for table in tables:
+        sql.append(f"INSERT OR IGNORE INTO TableVersion (table_name) VALUES ('{table}');")
+        for event in ("INSERT", "UPDATE", "DELETE"):
+            sql.append(
+                f"""
+            CREATE TRIGGER IF NOT EXISTS trg_version_{table.lower()}_{event.lower()}
+            AFTER {update if event == "UPDATE" else event} ON {table}
+            BEGIN
+                UPDATE TableVersion SET version = version + 1 WHERE table_name = '{table}';
+            END;"""
+            )
+    return "\n".join(sql)
+
+# Loads SearchIndex from its source tables; used by migration 6 and by bulk loads
+SEARCH_INDEX_FILL_SQL = """
+            INSERT INTO SearchIndex (rowid, kind, ref_id, name, detail)
+            SELECT student_id * 4 + 1, 'student', student_id,
+                   first_name || ' ' || last_name,
+                   COALESCE(email, '') || ' ' || COALESCE(major, '')
+            FROM Student;
+            INSERT INTO SearchIndex (rowid, kind, ref_id, name, detail)
+            SELECT employee_id * 4 + 2, 'instructor', employee_id,
+                   first_name || ' ' || last_name,
+                   COALESCE(email, '') || ' ' || COALESCE(position_title, '')
+            FROM Employee;
+            INSERT INTO SearchIndex (rowid, kind, ref_id, name, detail)
+            SELECT course_id * 4 + 3, 'course', course_id,
+                   course_code || ' ' || course_name, ''
+            FROM Course;
+"""
+
+def _student_totals_sql(students):
+    """
+    SQL that recomputes the credit-weighted grade totals and gpa for the students
+    matched by the given condition, and drops their cached transcript summaries.
+    """
+    return f"""
+                UPDATE Student
+                SET (grade_points, graded_credits) = (
+                    SELECT COALESCE(SUM(e.grade * c.credit), 0),
+                           COALESCE(SUM(CASE WHEN e.grade IS NOT NULL THEN c.credit END), 0)
+                    FROM Enrollment e
+                    JOIN CourseSelection cs ON e.selection_id = cs.selection_id
+                    JOIN Course c ON cs.course_id = c.course_id
+                    WHERE e.student_id = Student.student_id
+                )
+                WHERE student_id {students};
+                UPDATE Student SET gpa = grade_points / graded_credits / 25.0
+                WHERE student_id {students} AND graded_credits > 0;
+                DELETE FROM TranscriptSummary WHERE student_id {students};"""
 
-def get_section_schedule(db, selection_id):
+def _grade_delta_sql(row, sign):
     """
-    Returns list of rows: (day_code, start_time, end_time) for a section.
+    SQL that adds (sign '+') or removes (sign '-') one graded enrollment row
+    (NEW or OLD) from its student's credit-weighted totals.
     """
-    return db.execute(
-        """
-        SELECT day_code, start_time, end_time
-        FROM CourseSchedule
-        WHERE selection_id = ?
+    credit = f"""COALESCE((SELECT c.credit FROM CourseSelection cs
+                                  JOIN Course c ON cs.course_id = c.course_id
+                                  WHERE cs.selection_id = {row}.selection_id), 0)"""
+    return f"""
+                UPDATE Student
+                SET grade_points = grade_points {sign} {row}.grade * {credit},
+                    graded_credits = graded_credits {sign} {credit}
+                WHERE student_id = {row}.student_id AND {row}.grade IS NOT NULL;"""
+
+def _gpa_refresh_sql(students):
+    return f"""
+                UPDATE Student SET gpa = grade_points / graded_credits / 25.0
+                WHERE student_id {students} AND graded_credits > 0;"""
+
+# Each migration lists a few representative queries; `flask migrate` prints
+# their EXPLAIN QUERY PLAN before and after so the effect can be checked.
+MIGRATIONS = [
+    {
+        "version": 1,
+        "name": "secondary indexes for hot lookups",
+        "sql": """
+            CREATE INDEX IF NOT EXISTS idx_enrollment_student
+                ON Enrollment(student_id, selection_id);
+            CREATE INDEX IF NOT EXISTS idx_enrollment_selection
+                ON Enrollment(selection_id, student_id);
+            CREATE INDEX IF NOT EXISTS idx_courseschedule_selection
+                ON CourseSchedule(selection_id, day_code, start_time, end_time);
+            CREATE INDEX IF NOT EXISTS idx_attendance_selection_date
+                ON Attendance(selection_id, date, student_id, status);
+            CREATE INDEX IF NOT EXISTS idx_payroll_employee
+                ON Payroll(employee_id, pay_date);
+            CREATE INDEX IF NOT EXISTS idx_performancereview_employee
+                ON PerformanceReview(employee_id, review_date);
+            CREATE INDEX IF NOT EXISTS idx_courseselection_instructor
+                ON CourseSelection(instructor_id);
+            CREATE INDEX IF NOT EXISTS idx_courseselection_course
+                ON CourseSelection(course_id);
+            CREATE INDEX IF NOT EXISTS idx_courseprerequisite_course
+                ON CoursePrerequisite(course_id);
         """,
-        (selection_id,),
+        "plan_checks": [
+            ("SELECT selection_id FROM Enrollment WHERE student_id = ?", (1,)),
+            ("SELECT COUNT(*) FROM Enrollment WHERE selection_id = ?", (1,)),
+            ("SELECT day_code, start_time, end_time FROM CourseSchedule WHERE selection_id = ?", (1,)),
+            ("SELECT student_id, status FROM Attendance WHERE selection_id = ? AND date = ?", (1, "2024-01-01")),
+            ("SELECT * FROM Payroll WHERE employee_id = ? ORDER BY pay_date DESC", (1,)),
+            ("SELECT * FROM PerformanceReview WHERE employee_id = ? ORDER BY review_date DESC", (1,)),
+            ("SELECT selection_id FROM CourseSelection WHERE instructor_id = ?", (1,)),
+        ],
+    },
+    {
+        "version": 2,
+        "name": "materialized enrolled_count per section",
+        "sql": """
+            ALTER TABLE CourseSelection ADD COLUMN enrolled_count INTEGER NOT NULL DEFAULT 0;
+
+            UPDATE CourseSelection
+            SET enrolled_count = (
+                SELECT COUNT(*) FROM Enrollment e
+                WHERE e.selection_id = CourseSelection.selection_id
+            );
+
+            CREATE TRIGGER IF NOT EXISTS trg_enrollment_count_insert
+            AFTER INSERT ON Enrollment
+            BEGIN
+                UPDATE CourseSelection SET enrolled_count = enrolled_count + 1
+                WHERE selection_id = NEW.selection_id;
+            END;
+
+            CREATE TRIGGER IF NOT EXISTS trg_enrollment_count_delete
+            AFTER DELETE ON Enrollment
+            BEGIN
+                UPDATE CourseSelection SET enrolled_count = enrolled_count - 1
+                WHERE selection_id = OLD.selection_id;
+            END;
+
+            CREATE TRIGGER IF NOT EXISTS trg_enrollment_count_move
+            AFTER UPDATE OF selection_id ON Enrollment
+            WHEN OLD.selection_id IS NOT NEW.selection_id
+            BEGIN
+                UPDATE CourseSelection SET enrolled_count = enrolled_count - 1
+                WHERE selection_id = OLD.selection_id;
+                UPDATE CourseSelection SET enrolled_count = enrolled_count + 1
+                WHERE selection_id = NEW.selection_id;
+            END;
+        """,
+        "plan_checks": [
+            ("SELECT capacity, enrolled_count FROM CourseSelection WHERE selection_id = ?", (1,)),
+        ],
+    },
+    {
+        "version": 3,
+        "name": "incremental GPA from running grade sum/count",
+        "sql": """
+            ALTER TABLE Student ADD COLUMN grade_sum REAL NOT NULL DEFAULT 0;
+            ALTER TABLE Student ADD COLUMN graded_count INTEGER NOT NULL DEFAULT 0;
+
+            UPDATE Student
+            SET grade_sum = COALESCE((SELECT SUM(grade) FROM Enrollment e
+                                      WHERE e.student_id = Student.student_id), 0),
+                graded_count = (SELECT COUNT(grade) FROM Enrollment e
+                                WHERE e.student_id = Student.student_id);
+            UPDATE Student SET gpa = grade_sum / graded_count / 25.0
+            WHERE graded_count > 0;
+
+            -- gpa is only touched once the student has at least one grade
+            CREATE TRIGGER IF NOT EXISTS trg_enrollment_grade_update
+            AFTER UPDATE OF grade ON Enrollment
+            WHEN OLD.grade IS NOT NEW.grade
+            BEGIN
+                UPDATE Student
+                SET grade_sum = grade_sum - COALESCE(OLD.grade, 0) + COALESCE(NEW.grade, 0),
+                    graded_count = graded_count - (OLD.grade IS NOT NULL) + (NEW.grade IS NOT NULL),
+                    gpa = CASE
+                        WHEN graded_count - (OLD.grade IS NOT NULL) + (NEW.grade IS NOT NULL) > 0
+                        THEN (grade_sum - COALESCE(OLD.grade, 0) + COALESCE(NEW.grade, 0))
+                             / (graded_count - (OLD.grade IS NOT NULL) + (NEW.grade IS NOT NULL))
+                             / 25.0
+                        ELSE gpa
+                    END
+                WHERE student_id = NEW.student_id;
+            END;
+
+            CREATE TRIGGER IF NOT EXISTS trg_enrollment_grade_insert
+            AFTER INSERT ON Enrollment
+            WHEN NEW.grade IS NOT NULL
+            BEGIN
+                UPDATE Student
+                SET grade_sum = grade_sum + NEW.grade,
+                    graded_count = graded_count + 1,
+                    gpa = (grade_sum + NEW.grade) / (graded_count + 1) / 25.0
+                WHERE student_id = NEW.student_id;
+            END;
+
+            CREATE TRIGGER IF NOT EXISTS trg_enrollment_grade_delete
+            AFTER DELETE ON Enrollment
+            WHEN OLD.grade IS NOT NULL
+            BEGIN
+                UPDATE Student
+                SET grade_sum = grade_sum - OLD.grade,
+                    graded_count = graded_count - 1,
+                    gpa = CASE
+                        WHEN graded_count > 1
+                        THEN (grade_sum - OLD.grade) / (graded_count - 1) / 25.0
+                        ELSE gpa
+                    END
+                WHERE student_id = OLD.student_id;
+            END;
+        """,
+        "plan_checks": [
+            ("SELECT SUM(grade), COUNT(grade) FROM Enrollment WHERE student_id = ?", (1,)),
+        ],
+    },
+    {
+        "version": 4,
+        "name": "attendance upsert key and per-section/student rollup",
+        "sql": """
+            -- One record per student per section per day (keep the latest)
+            DELETE FROM Attendance
+            WHERE attendance_id NOT IN (
+                SELECT MAX(attendance_id) FROM Attendance
+                GROUP BY student_id, selection_id, date
+            );
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_attendance_student_day
+                ON Attendance(student_id, selection_id, date);
+
+            CREATE TABLE IF NOT EXISTS AttendanceRollup (
+                selection_id INTEGER NOT NULL,
+                student_id INTEGER NOT NULL,
+                present_count INTEGER NOT NULL DEFAULT 0,
+                absent_count INTEGER NOT NULL DEFAULT 0,
+                late_count INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (selection_id, student_id)
+            ) WITHOUT ROWID;
+
+            INSERT INTO AttendanceRollup (selection_id, student_id, present_count, absent_count, late_count)
+            SELECT selection_id, student_id,
+                   SUM(status = 'Present'), SUM(status = 'Absent'), SUM(status = 'Late')
+            FROM Attendance
+            GROUP BY selection_id, student_id;
+
+            CREATE TRIGGER IF NOT EXISTS trg_attendance_rollup_insert
+            AFTER INSERT ON Attendance
+            BEGIN
+                INSERT INTO AttendanceRollup (selection_id, student_id, present_count, absent_count, late_count)
+                VALUES (NEW.selection_id, NEW.student_id,
+                        NEW.status = 'Present', NEW.status = 'Absent', NEW.status = 'Late')
+                ON CONFLICT (selection_id, student_id) DO UPDATE
+                SET present_count = present_count + (NEW.status = 'Present'),
+                    absent_count = absent_count + (NEW.status = 'Absent'),
+                    late_count = late_count + (NEW.status = 'Late');
+            END;
+
+            CREATE TRIGGER IF NOT EXISTS trg_attendance_rollup_delete
+            AFTER DELETE ON Attendance
+            BEGIN
+                UPDATE AttendanceRollup
+                SET present_count = present_count - (OLD.status = 'Present'),
+                    absent_count = absent_count - (OLD.status = 'Absent'),
+                    late_count = late_count - (OLD.status = 'Late')
+                WHERE selection_id = OLD.selection_id AND student_id = OLD.student_id;
+            END;
+
+            CREATE TRIGGER IF NOT EXISTS trg_attendance_rollup_update
+            AFTER UPDATE OF status, student_id, selection_id ON Attendance
+            BEGIN
+                UPDATE AttendanceRollup
+                SET present_count = present_count - (OLD.status = 'Present'),
+                    absent_count = absent_count - (OLD.status = 'Absent'),
+                    late_count = late_count - (OLD.status = 'Late')
+                WHERE selection_id = OLD.selection_id AND student_id = OLD.student_id;
+
+                INSERT INTO AttendanceRollup (selection_id, student_id, present_count, absent_count, late_count)
+                VALUES (NEW.selection_id, NEW.student_id,
+                        NEW.status = 'Present', NEW.status = 'Absent', NEW.status = 'Late')
+                ON CONFLICT (selection_id, student_id) DO UPDATE
+                SET present_count = present_count + (NEW.status = 'Present'),
+                    absent_count = absent_count + (NEW.status = 'Absent'),
+                    late_count = late_count + (NEW.status = 'Late');
+            END;
+        """,
+        "plan_checks": [
+            ("SELECT SUM(present_count), SUM(absent_count), SUM(late_count) "
+             "FROM AttendanceRollup WHERE selection_id = ?", (1,)),
+        ],
+    },
+    {
+        "version": 5,
+        "name": "student directory keyset index",
+        "sql": """
+            CREATE INDEX IF NOT EXISTS idx_student_name
+                ON Student(last_name, first_name, student_id);
+        """,
+        "plan_checks": [
+            ("SELECT * FROM Student WHERE (last_name, first_name, student_id) > (?, ?, ?) "
+             "ORDER BY last_name, first_name, student_id LIMIT 11", ("M", "", 0)),
+        ],
+    },
+    {
+        "version": 6,
+        "name": "full-text search index over students, instructors and courses",
+        "sql": """
+            -- rowid = source id * 4 + kind code (1 student, 2 instructor, 3 course),
+            -- so triggers can find a row's index entry without scanning
+            CREATE VIRTUAL TABLE IF NOT EXISTS SearchIndex USING fts5(
+                kind UNINDEXED,
+                ref_id UNINDEXED,
+                name,
+                detail,
+                tokenize = 'unicode61 remove_diacritics 2',
+                prefix = '2 3'
+            );
+        """ + SEARCH_INDEX_FILL_SQL + """
+            CREATE TRIGGER IF NOT EXISTS trg_search_student_insert
+            AFTER INSERT ON Student
+            BEGIN
+                INSERT INTO SearchIndex (rowid, kind, ref_id, name, detail)
+                VALUES (NEW.student_id * 4 + 1, 'student', NEW.student_id,
+                        NEW.first_name || ' ' || NEW.last_name,
+                        COALESCE(NEW.email, '') || ' ' || COALESCE(NEW.major, ''));
+            END;
+
+            CREATE TRIGGER IF NOT EXISTS trg_search_student_update
+            AFTER UPDATE OF first_name, last_name, email, major ON Student
+            BEGIN
+                DELETE FROM SearchIndex WHERE rowid = OLD.student_id * 4 + 1;
+                INSERT INTO SearchIndex (rowid, kind, ref_id, name, detail)
+                VALUES (NEW.student_id * 4 + 1, 'student', NEW.student_id,
+                        NEW.first_name || ' ' || NEW.last_name,
+                        COALESCE(NEW.email, '') || ' ' || COALESCE(NEW.major, ''));
+            END;
+
+            CREATE TRIGGER IF NOT EXISTS trg_search_student_delete
+            AFTER DELETE ON Student
+            BEGIN
+                DELETE FROM SearchIndex WHERE rowid = OLD.student_id * 4 + 1;
+            END;
+
+            CREATE TRIGGER IF NOT EXISTS trg_search_employee_insert
+            AFTER INSERT ON Employee
+            BEGIN
+                INSERT INTO SearchIndex (rowid, kind, ref_id, name, detail)
+                VALUES (NEW.employee_id * 4 + 2, 'instructor', NEW.employee_id,
+                        NEW.first_name || ' ' || NEW.last_name,
+                        COALESCE(NEW.email, '') || ' ' || COALESCE(NEW.position_title, ''));
+            END;
+
+            CREATE TRIGGER IF NOT EXISTS trg_search_employee_update
+            AFTER UPDATE OF first_name, last_name, email, position_title ON Employee
+            BEGIN
+                DELETE FROM SearchIndex WHERE rowid = OLD.employee_id * 4 + 2;
+                INSERT INTO SearchIndex (rowid, kind, ref_id, name, detail)
+                VALUES (NEW.employee_id * 4 + 2, 'instructor', NEW.employee_id,
+                        NEW.first_name || ' ' || NEW.last_name,
+                        COALESCE(NEW.email, '') || ' ' || COALESCE(NEW.position_title, ''));
+            END;
+
+            CREATE TRIGGER IF NOT EXISTS trg_search_employee_delete
+            AFTER DELETE ON Employee
+            BEGIN
+                DELETE FROM SearchIndex WHERE rowid = OLD.employee_id * 4 + 2;
+            END;
+
+            CREATE TRIGGER IF NOT EXISTS trg_search_course_insert
+            AFTER INSERT ON Course
+            BEGIN
+                INSERT INTO SearchIndex (rowid, kind, ref_id, name, detail)
+                VALUES (NEW.course_id * 4 + 3, 'course', NEW.course_id,
+                        NEW.course_code || ' ' || NEW.course_name, '');
+            END;
+
+            CREATE TRIGGER IF NOT EXISTS trg_search_course_update
+            AFTER UPDATE OF course_code, course_name ON Course
+            BEGIN
+                DELETE FROM SearchIndex WHERE rowid = OLD.course_id * 4 + 3;
+                INSERT INTO SearchIndex (rowid, kind, ref_id, name, detail)
+                VALUES (NEW.course_id * 4 + 3, 'course', NEW.course_id,
+                        NEW.course_code || ' ' || NEW.course_name, '');
+            END;
+
+            CREATE TRIGGER IF NOT EXISTS trg_search_course_delete
+            AFTER DELETE ON Course
+            BEGIN
+                DELETE FROM SearchIndex WHERE rowid = OLD.course_id * 4 + 3;
+            END;
+        """,
+        "plan_checks": [
+            ("SELECT kind, ref_id FROM SearchIndex WHERE SearchIndex MATCH ? ORDER BY rank LIMIT 50",
+             ('"smi"*',)),
+        ],
+    },
+    {
+        "version": 7,
+        "name": "application queue and account lookup indexes",
+        "sql": """
+            CREATE INDEX IF NOT EXISTS idx_student_status_applied
+                ON Student(status, IFNULL(applied_on, ''), student_id);
+            CREATE INDEX IF NOT EXISTS idx_useraccount_student
+                ON UserAccount(student_id);
+        """,
+        "plan_checks": [
+            ("SELECT * FROM Student WHERE status = 'Pending' "
+             "AND (IFNULL(applied_on, ''), student_id) > (?, ?) "
+             "ORDER BY IFNULL(applied_on, ''), student_id LIMIT 51", ("", 0)),
+            ("SELECT 1 FROM UserAccount WHERE student_id = ?", (1,)),
+        ],
+    },
+    {
+        "version": 8,
+        "name": "per-table change counters, starting with CoursePrerequisite",
+        "sql": """
+            -- Bumped by triggers on every write, so in-process caches can tell
+            -- whether their copy is current with a single primary-key lookup
+            CREATE TABLE IF NOT EXISTS TableVersion (
+                table_name TEXT PRIMARY KEY,
+                version INTEGER NOT NULL DEFAULT 0
+            ) WITHOUT ROWID;
+        """ + _table_version_sql("CoursePrerequisite"),
+        "plan_checks": [
+            ("SELECT version FROM TableVersion WHERE table_name = ?", ("CoursePrerequisite",)),
+        ],
+    },
+    {
+        "version": 9,
+        "name": "credit-weighted GPA and cached transcript summaries",
+        "sql": """
+            -- The running sums from migration 3 become credit-weighted:
+            -- gpa = SUM(grade * credit) / SUM(credit of graded courses) / 25
+            DROP TRIGGER IF EXISTS trg_enrollment_grade_update;
+            DROP TRIGGER IF EXISTS trg_enrollment_grade_insert;
+            DROP TRIGGER IF EXISTS trg_enrollment_grade_delete;
+            ALTER TABLE Student RENAME COLUMN grade_sum TO grade_points;
+            ALTER TABLE Student RENAME COLUMN graded_count TO graded_credits;
+
+            -- One row per student, rebuilt on the next transcript view after
+            -- anything on it changes
+            CREATE TABLE IF NOT EXISTS TranscriptSummary (
+                student_id INTEGER PRIMARY KEY
+                    REFERENCES Student(student_id) ON DELETE CASCADE,
+                gpa REAL,
+                total_credits INTEGER NOT NULL,
+                graded_credits INTEGER NOT NULL,
+                payload TEXT NOT NULL,
+                computed_at TEXT NOT NULL
+            );
+        """ + _student_totals_sql("IN (SELECT student_id FROM Student)") + """
+
+            -- Graded rows apply a delta of grade * credit and credit, as the
+            -- migration 3 triggers did with grade and 1; ungraded rows skip them
+            CREATE TRIGGER IF NOT EXISTS trg_enrollment_grade_insert
+            AFTER INSERT ON Enrollment
+            WHEN NEW.grade IS NOT NULL
+            BEGIN""" + _grade_delta_sql("NEW", "+") + _gpa_refresh_sql("= NEW.student_id") + """
+            END;
+
+            CREATE TRIGGER IF NOT EXISTS trg_enrollment_grade_update
+            AFTER UPDATE OF grade, selection_id, student_id ON Enrollment
+            WHEN (OLD.grade IS NOT NULL OR NEW.grade IS NOT NULL)
+                 AND (OLD.grade IS NOT NEW.grade
+                      OR OLD.selection_id IS NOT NEW.selection_id
+                      OR OLD.student_id IS NOT NEW.student_id)
+            BEGIN""" + _grade_delta_sql("OLD", "-") + _grade_delta_sql("NEW", "+") + _gpa_refresh_sql(
+                "IN (OLD.student_id, NEW.student_id)"
+            ) + """
+            END;
+
+            CREATE TRIGGER IF NOT EXISTS trg_enrollment_grade_delete
+            AFTER DELETE ON Enrollment
+            WHEN OLD.grade IS NOT NULL
+            BEGIN""" + _grade_delta_sql("OLD", "-") + _gpa_refresh_sql("= OLD.student_id") + """
+            END;
+
+            -- Anything on an enrollment row can appear on the transcript
+            CREATE TRIGGER IF NOT EXISTS trg_enrollment_summary_insert
+            AFTER INSERT ON Enrollment
+            BEGIN
+                DELETE FROM TranscriptSummary WHERE student_id = NEW.student_id;
+            END;
+
+            CREATE TRIGGER IF NOT EXISTS trg_enrollment_summary_update
+            AFTER UPDATE ON Enrollment
+            BEGIN
+                DELETE FROM TranscriptSummary WHERE student_id IN (OLD.student_id, NEW.student_id);
+            END;
+
+            CREATE TRIGGER IF NOT EXISTS trg_enrollment_summary_delete
+            AFTER DELETE ON Enrollment
+            BEGIN
+                DELETE FROM TranscriptSummary WHERE student_id = OLD.student_id;
+            END;
+
+            -- A credit change moves every enrolled student's totals; a new code
+            -- or name only changes what their transcripts show
+            CREATE TRIGGER IF NOT EXISTS trg_course_totals_update
+            AFTER UPDATE OF credit ON Course
+            WHEN OLD.credit IS NOT NEW.credit
+            BEGIN""" + _student_totals_sql(
+                """IN (SELECT e.student_id FROM Enrollment e
+                                     JOIN CourseSelection cs ON e.selection_id = cs.selection_id
+                                     WHERE cs.course_id = NEW.course_id)"""
+            ) + """
+            END;
+
+            CREATE TRIGGER IF NOT EXISTS trg_course_summary_update
+            AFTER UPDATE OF course_code, course_name ON Course
+            BEGIN
+                DELETE FROM TranscriptSummary
+                WHERE student_id IN (SELECT e.student_id FROM Enrollment e
+                                     JOIN CourseSelection cs ON e.selection_id = cs.selection_id
+                                     WHERE cs.course_id = NEW.course_id);
+            END;
+
+            CREATE TRIGGER IF NOT EXISTS trg_selection_totals_update
+            AFTER UPDATE OF course_id ON CourseSelection
+            BEGIN""" + _student_totals_sql(
+                "IN (SELECT student_id FROM Enrollment WHERE selection_id = NEW.selection_id)"
+            ) + """
+            END;
+        """,
+        "plan_checks": [
+            ("SELECT payload FROM TranscriptSummary WHERE student_id = ?", (1,)),
+        ],
+    },
+    {
+        "version": 10,
+        "name": "change counters for reference tables",
+        "sql": _table_version_sql("Department", "Room", "Building", "Employee"),
+        "plan_checks": [],
+    },
+    {
+        "version": 11,
+        "name": "change counters for the course catalog",
+        # enrolled_count moves on every enrollment; seat counts are never cached
+        "sql": _table_version_sql("Course", "CourseSchedule") + _table_version_sql(
+            "CourseSelection",
+            update_of=("course_id", "instructor_id", "room_id", "capacity"),
+        ),
+        "plan_checks": [],
+    },
+    {
+        "version": 12,
+        "name": "change counter for enrollments",
+        "sql": _table_version_sql("Enrollment"),
+        "plan_checks": [],
+    },
+]
+
+# Databases already brought up to date by this process
+_migrated_databases = set()
+_migration_lock = threading.Lock()
+
+def explain_plan(db, sql, params=()):
+    """
+    Returns the EXPLAIN QUERY PLAN detail lines for a statement.
+    """
+    return [row["detail"] for row in db.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+
+def table_versions(db, *tables):
+    """
+    Current change counters for the given tables, as a tuple in the same order.
+    """
+    rows = db.execute(
+        "SELECT table_name, version FROM TableVersion "
+        "WHERE table_name IN (SELECT value FROM json_each(?))",
+        (json.dumps(tables),),
     ).fetchall()
+    versions = {row["table_name"]: row["version"] for row in rows}
+    return tuple(versions.get(table, 0) for table in tables)
+
+def get_schema_version(db):
+    db.execute(
+        """
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_on TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+        """
+    )
+    db.commit()
+    return db.execute("SELECT COALESCE(MAX(version), 0) AS v FROM schema_version").fetchone()["v"]
+
+def _split_statements(script):
+    """
+    Split a SQL script into single statements (trigger bodies stay whole),
+    so they can run one at a time inside a transaction we opened ourselves.
+    executescript would commit that transaction first.
+    """
+    statements = []
+    current = ""
+    for piece in script.split(";"):
+        current += piece + ";"
+        if sqlite3.complete_statement(current):
+            if current.strip(" \t\r\n;"):
+                statements.append(current)
+            current = ""
+    return statements
+
+def migrate_db(db, report=None):
+    """
+    Apply every migration newer than the recorded schema version.
+    Each migration runs in its own transaction together with its schema_version row.
+    The version is re-read once that transaction holds the write lock, so a
+    migration another process applied in the meantime is skipped, not repeated.
+    Returns the list of versions applied.
+    """
+    current = get_schema_version(db)
+    applied = []
+
+    for migration in MIGRATIONS:
+        if migration["version"] <= current:
+            continue
+
+        checks = migration.get("plan_checks", [])
+        before = []
+        for sql, params in checks:
+            # A check may rely on a column the migration itself adds
+            try:
+                before.append(explain_plan(db, sql, params))
+            except sqlite3.Error as e:
+                before.append([f"n/a ({e})"])
+
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            current = db.execute(
+                "SELECT COALESCE(MAX(version), 0) AS v FROM schema_version"
+            ).fetchone()["v"]
+            if migration["version"] <= current:
+                db.rollback()
+                continue
+            for statement in _split_statements(migration["sql"]):
+                db.execute(statement)
+            db.execute(
+                "INSERT INTO schema_version (version, name) VALUES (?, ?)",
+                (migration["version"], migration["name"]),
+            )
+            db.commit()
+        except sqlite3.Error:
+            if db.in_transaction:
+                db.rollback()
+            raise
+
+        applied.append(migration["version"])
+
+        if report:
+            report(f"Applied migration {migration['version']}: {migration['name']}")
+            for (sql, params), plan_before in zip(checks, before):
+                plan_after = explain_plan(db, sql, params)
+                report(f"  {sql}")
+                report(f"    before: {'; '.join(plan_before)}")
+                report(f"    after:  {'; '.join(plan_after)}")
+
+    return applied
+
+def ensure_migrated(db):
+    if DATABASE in _migrated_databases:
+        return
+    # One thread migrates; the others wait here and then find it done
+    with _migration_lock:
+        if DATABASE in _migrated_databases:
+            return
+        migrate_db(db)
+        _migrated_databases.add(DATABASE)
+
+def reconcile_enrolled_counts(db):
+    """
+    Rebuild CourseSelection.enrolled_count from Enrollment.
+    Returns how many sections had drifted from the true count.
+    """
+    cur = db.execute(
+        """
+        UPDATE CourseSelection
+        SET enrolled_count = (
+            SELECT COUNT(*) FROM Enrollment e
+            WHERE e.selection_id = CourseSelection.selection_id
+        )
+        WHERE enrolled_count IS NOT (
+            SELECT COUNT(*) FROM Enrollment e
+            WHERE e.selection_id = CourseSelection.selection_id
+        )
+        """
+    )
+    db.commit()
+    return cur.rowcount
+
+def reconcile_grade_totals(db):
+    """
+    Rebuild Student.grade_points/graded_credits (and gpa, where graded) from Enrollment.
+    Returns how many students were corrected.
+    """
+    cur = db.execute(
+        """
+        UPDATE Student
+        SET grade_points = totals.grade_points,
+            graded_credits = totals.graded_credits,
+            gpa = CASE WHEN totals.graded_credits > 0
+                       THEN totals.grade_points / totals.graded_credits / 25.0
+                       ELSE Student.gpa END
+        FROM (
+            SELECT s.student_id,
+                   COALESCE(SUM(e.grade * c.credit), 0) * 1.0 AS grade_points,
+                   COALESCE(SUM(CASE WHEN e.grade IS NOT NULL THEN c.credit END), 0)
+                       AS graded_credits
+            FROM Student s
+            LEFT JOIN Enrollment e ON e.student_id = s.student_id
+            LEFT JOIN CourseSelection cs ON e.selection_id = cs.selection_id
+            LEFT JOIN Course c ON cs.course_id = c.course_id
+            GROUP BY s.student_id
+        ) AS totals
+        WHERE totals.student_id = Student.student_id
+          AND (Student.grade_points IS NOT totals.grade_points
+               OR Student.graded_credits IS NOT totals.graded_credits
+               OR (totals.graded_credits > 0
+                   AND Student.gpa IS NOT totals.grade_points / totals.graded_credits / 25.0))
+        """
+    )
+    # Summaries may have been built from the drifted totals
+    db.execute("DELETE FROM TranscriptSummary")
+    db.commit()
+    return cur.rowcount
+
+def rebuild_search_index(db):
+    """
+    Reload SearchIndex from Student, Employee and Course.
+    """
+    db.executescript(
+        "BEGIN;\nDELETE FROM SearchIndex;\n" + SEARCH_INDEX_FILL_SQL + "\nCOMMIT;"
+    )
+
+def rebuild_attendance_rollup(db):
+    """
+    Recompute AttendanceRollup from Attendance. Returns the number of rollup rows.
+    """
+    db.execute("DELETE FROM AttendanceRollup")
+    cur = db.execute(
+        """
+        INSERT INTO AttendanceRollup (selection_id, student_id, present_count, absent_count, late_count)
+        SELECT selection_id, student_id,
+               SUM(status = 'Present'), SUM(status = 'Absent'), SUM(status = 'Late')
+        FROM Attendance
+        GROUP BY selection_id, student_id
+        """
+    )
+    db.commit()
+    return cur.rowcount
+
+def init_db(db, report=None):
+    """
+    Drop every table, reload schema.sql (baseline + demo data), then apply all migrations.
+    """
+    # Tables are dropped in arbitrary order, so suspend FK enforcement meanwhile
+    db.execute("PRAGMA foreign_keys = OFF")
+    tables = db.execute(
+        """
+        SELECT name FROM sqlite_master
+        WHERE type = 'table' AND name NOT LIKE 'sqlite_%'
+        ORDER BY sql LIKE 'CREATE VIRTUAL%' DESC
+        """
+    ).fetchall()
+    for row in tables:
+        db.execute(f'DROP TABLE IF EXISTS "{row["name"]}"')
+    db.commit()
+
+    with app.open_resource(SCHEMA_FILE) as f:
+        db.executescript(f.read().decode("utf8"))
+    db.execute("PRAGMA foreign_keys = ON")
+
+    return migrate_db(db, report=report)
+
+@app.cli.command("init-db")
+def init_db_command():
+    """Recreate the database from schema.sql and apply all migrations."""
+    db = open_connection()
+    try:
+        init_db(db, report=click.echo)
+    finally:
+        db.close()
+    click.echo(f"Initialized {DATABASE} at schema version {MIGRATIONS[-1]['version']}.")
+
+@app.cli.command("migrate")
+def migrate_command():
+    """Apply pending schema migrations to the existing database."""
+    db = open_connection()
+    try:
+        applied = migrate_db(db, report=click.echo)
+        version = get_schema_version(db)
+    finally:
+        db.close()
+    if not applied:
+        click.echo(f"{DATABASE} is already at schema version {version}.")
+
+@app.cli.command("reconcile-counts")
+def reconcile_counts_command():
+    """Rebuild materialized counters from the underlying tables."""
+    db = open_connection()
+    try:
+        migrate_db(db)
+        fixed = reconcile_enrolled_counts(db)
+        fixed_grades = reconcile_grade_totals(db)
+        rollup_rows = rebuild_attendance_rollup(db)
+    finally:
+        db.close()
+    click.echo(f"Section enrolled counts rebuilt ({fixed} corrected).")
+    click.echo(f"Student grade totals rebuilt ({fixed_grades} corrected).")
+    click.echo(f"Attendance rollup rebuilt ({rollup_rows} rows).")
+
+# IN-PROCESS CACHES
+# Small named caches for data that is read far more often than it changes.
+# Writers call invalidate_cache(name); each invalidation bumps the name's
+# generation so a load that raced with a write is never stored.
+_cache_lock = threading.Lock()
+_cache = {}
+_cache_generations = {}
+_cache_stats = {}
+
+def cached(name, loader, ttl=None, version=None):
+    """
+    Returns (value, loaded_at) for name, calling loader() on a miss,
+    after an invalidation, once the entry is older than ttl seconds,
+    or when version differs from the one the entry was loaded at.
+    """
+    now = time.time()
+    with _cache_lock:
+        stats = _cache_stats.setdefault(name, {"hits": 0, "misses": 0})
+        entry = _cache.get(name)
+        if entry and entry[2] == version and (ttl is None or now - entry[1] < ttl):
+            stats["hits"] += 1
+            return entry[0], entry[1]
+        stats["misses"] += 1
+        generation = _cache_generations.get(name, 0)
+
+    entry = (loader(), now, version)
+
+    with _cache_lock:
+        if _cache_generations.get(name, 0) == generation:
+            _cache[name] = entry
+    return entry[0], entry[1]
+
+def invalidate_cache(*names):
+    with _cache_lock:
+        for name in names:
+            _cache.pop(name, None)
+            _cache_generations[name] = _cache_generations.get(name, 0) + 1
+
+def cache_stats():
+    with _cache_lock:
+        return {name: dict(stats) for name, stats in _cache_stats.items()}
+
+# Reference data for form pick-lists. Each list is cached against the
+# TableVersion counters of the tables it reads, so a write from any process
+# retires it; a form render then costs one primary-key lookup, not a query.
+REFERENCE_DATA = {
+    "departments": (
+        ("Department",),
+        "SELECT * FROM Department ORDER BY department_name",
+    ),
+    "rooms": (
+        ("Room", "Building"),
+        """
+        SELECT r.room_id, r.room_number, b.building_name
+        FROM Room r
+        JOIN Building b ON r.building_id = b.building_id
+        ORDER BY b.building_name, r.room_number
+        """,
+    ),
+    "instructors": (
+        ("Employee",),
+        "SELECT employee_id, first_name || ' ' || last_name AS name FROM Employee ORDER BY last_name",
+    ),
+}
+
+def reference_data(db, name):
+    """
+    Cached rows (as dicts) for one of the REFERENCE_DATA lists.
+    """
+    tables, sql = REFERENCE_DATA[name]
+    rows, _ = cached(
+        f"ref:{name}",
+        lambda: tuple(dict(row) for row in db.execute(sql)),
+        version=table_versions(db, *tables),
+    )
+    return rows
+
+# Rendered HTML fragments for the course catalog. A fragment is keyed on the
+# catalog version, which moves whenever a table it is rendered from changes,
+# so catalog pages are served from memory until the next edit.
+CATALOG_TABLES = (
+    "Course", "CourseSelection", "CourseSchedule",
+    "Department", "Employee", "Room", "Building",
+)
+
+def catalog_version(db):
+    return table_versions(db, *CATALOG_TABLES)
+
+def render_fragment(name, template, load, version):
+    """
+    Rendered template for name, cached until version changes. load() returns
+    the template context and is only called on a miss.
+    """
+    html, _ = cached(
+        f"fragment:{name}",
+        lambda: Markup(render_template(template, **load())),
+        version=version,
+    )
+    return html
+
+# SCHEDULE / CONFLICT HELPERS
+DAY_ORDER = {"M": 1, "T": 2, "W": 3, "Th": 4, "F": 5}
 
 def build_meeting_label(rows):
     """
@@ -58,18 +1585,45 @@ def build_meeting_label(rows):
 
     return f"{day_str} {start_time}-{end_time}"
 
+# Keeps each IN (...) list well under SQLite's host-parameter limit
+SCHEDULE_BATCH_SIZE = 500
+
+def get_section_schedules(db, selection_ids):
+    """
+    Returns {selection_id: [rows]} for every section in selection_ids.
+    Loads CourseSchedule in chunked IN (...) queries instead of one query per section.
+    """
+    ids = sorted({sid for sid in selection_ids if sid is not None})
+    schedules = {sid: [] for sid in ids}
+
+    for i in range(0, len(ids), SCHEDULE_BATCH_SIZE):
+        chunk = ids[i:i + SCHEDULE_BATCH_SIZE]
+        placeholders = ",".join("?" * len(chunk))
+        rows = db.execute(
+            f"""
+            SELECT selection_id, day_code, start_time, end_time
+            FROM CourseSchedule
+            WHERE selection_id IN ({placeholders})
+            """,
+            chunk,
+        ).fetchall()
+        for r in rows:
+            schedules[r["selection_id"]].append(r)
+
+    return schedules
+
 def attach_meeting_labels(db, rows):
     """
     Takes an iterable of sqlite3.Row objects that contain selection_id
     and returns a list of dicts with an extra 'meeting_label' field.
     """
+    rows = list(rows)
+    schedules = get_section_schedules(db, [row["selection_id"] for row in rows])
+
     out = []
     for row in rows:
-        selection_id = row["selection_id"]
-        sched = get_section_schedule(db, selection_id)
-        label = build_meeting_label(sched)
         d = dict(row)
-        d["meeting_label"] = label
+        d["meeting_label"] = build_meeting_label(schedules.get(row["selection_id"], []))
         out.append(d)
     return out
 
@@ -78,25 +1632,971 @@ def _time_to_minutes(t):
     h, m = map(int, t.split(":"))
     return h * 60 + m
 
-def sections_conflict(db, selection_new, selection_existing):
+# Weekly timetable encoding: every minute of the week is one bit, so a section's
+# meetings become a single int and conflict checks are one AND.
+MINUTES_PER_DAY = 24 * 60
+DAY_SLOTS = {day: i for i, day in enumerate(sorted(DAY_ORDER, key=DAY_ORDER.get))}
+
+def _day_slot(day_code):
+    # Unknown day codes still get their own slot so they only clash with themselves
+    return DAY_SLOTS.setdefault(day_code, len(DAY_SLOTS))
+
+def meeting_mask(rows):
+    """
+    Encode CourseSchedule rows as a bitmask of occupied minutes in the week.
+    Meetings are half-open [start, end), so back-to-back classes don't conflict.
+    """
+    mask = 0
+    for r in rows:
+        start = _time_to_minutes(r["start_time"])
+        end = _time_to_minutes(r["end_time"])
+        if end <= start:
+            continue
+        offset = _day_slot(r["day_code"]) * MINUTES_PER_DAY + start
+        mask |= ((1 << (end - start)) - 1) << offset
+    return mask
+
+def get_section_masks(db, selection_ids):
+    """
+    Returns {selection_id: mask}. Masks are built once per request and kept on g,
+    so repeated checks in the same request don't go back to CourseSchedule.
+    """
+    cache = g.setdefault("section_masks", {})
+    missing = [sid for sid in set(selection_ids) if sid not in cache]
+    if missing:
+        for sid, rows in get_section_schedules(db, missing).items():
+            cache[sid] = meeting_mask(rows)
+    return {sid: cache.get(sid, 0) for sid in selection_ids}
+
+def student_timetable_mask(db, student_id):
+    """
+    Union of the meeting masks of every section the student is enrolled in.
+    """
+    rows = db.execute(
+        "SELECT selection_id FROM Enrollment WHERE student_id = ?",
+        (student_id,),
+    ).fetchall()
+
+    mask = 0
+    for m in get_section_masks(db, [r["selection_id"] for r in rows]).values():
+        mask |= m
+    return mask
+
+def section_catalog(db):
     """
-    True if CourseSchedule for selection_new conflicts in time
-    with CourseSchedule for selection_existing.
+    Every section with its course, instructor, room, meeting label and meeting
+    mask, ordered by course code. Cached against the catalog version; seat
+    counts change with every enrollment and are left to the caller.
     """
-    sched_new = get_section_schedule(db, selection_new)
-    sched_existing = get_section_schedule(db, selection_existing)
+    def load():
+        rows = db.execute(
+            """
+            SELECT cs.selection_id,
+                   cs.course_id,
+                   c.course_code,
+                   c.course_name,
+                   cs.capacity,
+                   e.first_name || ' ' || e.last_name AS instructor_name,
+                   b.building_name,
+                   r.room_number
+            FROM CourseSelection cs
+            JOIN Course c ON cs.course_id = c.course_id
+            LEFT JOIN Employee e ON cs.instructor_id = e.employee_id
+            LEFT JOIN Room r ON cs.room_id = r.room_id
+            LEFT JOIN Building b ON r.building_id = b.building_id
+            ORDER BY c.course_code, cs.selection_id
+            """
+        ).fetchall()
+        schedules = get_section_schedules(db, [row["selection_id"] for row in rows])
+
+        sections = []
+        for row in rows:
+            d = dict(row)
+            meetings = schedules.get(row["selection_id"], [])
+            d["meeting_label"] = build_meeting_label(meetings)
+            d["mask"] = meeting_mask(meetings)
+            sections.append(d)
+        return tuple(sections)
 
-    for r1 in sched_new:
-        for r2 in sched_existing:
-            if r1["day_code"] != r2["day_code"]:
+    sections, _ = cached("section_catalog", load, version=catalog_version(db))
+    return sections
+
+# PREREQUISITES
+PASSING_GRADE = 70
+
+def find_prereq_cycles(direct):
+    """
+    Returns every cycle in the prerequisite graph as a list of course_ids.
+    """
+    cycles = []
+    state = {}  # course_id -> 1 while on the DFS stack, 2 when finished
+
+    for root in direct:
+        if root in state:
+            continue
+        stack = [(root, iter(direct.get(root, ())))]
+        path = [root]
+        state[root] = 1
+        while stack:
+            node, children = stack[-1]
+            child = next(children, None)
+            if child is None:
+                stack.pop()
+                path.pop()
+                state[node] = 2
+            elif state.get(child) == 1:
+                cycles.append(path[path.index(child):] + [child])
+            elif child not in state:
+                state[child] = 1
+                path.append(child)
+                stack.append((child, iter(direct.get(child, ()))))
+    return cycles
+
+def _load_prereq_graph(db):
+    direct = {}
+    for row in db.execute("SELECT course_id, prereq_course_id FROM CoursePrerequisite"):
+        direct.setdefault(row["course_id"], set()).add(row["prereq_course_id"])
+
+    # Transitive closure: everything reachable from each course
+    closure = {}
+    for course_id in direct:
+        seen = set()
+        todo = list(direct[course_id])
+        while todo:
+            prereq = todo.pop()
+            if prereq in seen:
                 continue
-            s1 = _time_to_minutes(r1["start_time"])
-            e1 = _time_to_minutes(r1["end_time"])
-            s2 = _time_to_minutes(r2["start_time"])
-            e2 = _time_to_minutes(r2["end_time"])
-            if s1 < e2 and s2 < e1:
-                return True
-    return False
+            seen.add(prereq)
+            todo.extend(direct.get(prereq, ()))
+        # A course caught in a cycle can't require itself
+        seen.discard(course_id)
+        closure[course_id] = frozenset(seen)
+
+    return {"direct": direct, "closure": closure, "cycles": find_prereq_cycles(direct)}
+
+def get_prereq_graph(db):
+    """
+    The prerequisite DAG with its transitive closure, rebuilt only when
+    CoursePrerequisite has changed since it was last loaded.
+    """
+    graph, _ = cached(
+        "prereq_graph",
+        lambda: _load_prereq_graph(db),
+        version=table_versions(db, "CoursePrerequisite"),
+    )
+    return graph
+
+def missing_prerequisites(db, student_id, course_id):
+    """
+    Course ids in the full prerequisite chain of course_id that the student
+    has not passed, checked in a single query.
+    """
+    needed = get_prereq_graph(db)["closure"].get(course_id)
+    if not needed:
+        return []
+
+    rows = db.execute(
+        """
+        SELECT value AS course_id
+        FROM json_each(?)
+        WHERE value NOT IN (
+            SELECT cs.course_id
+            FROM Enrollment e
+            JOIN CourseSelection cs ON e.selection_id = cs.selection_id
+            WHERE e.student_id = ? AND e.grade >= ?
+        )
+        """,
+        (json.dumps(sorted(needed)), student_id, PASSING_GRADE),
+    ).fetchall()
+    return [row["course_id"] for row in rows]
+
+@app.cli.command("check-prereqs")
+def check_prereqs_command():
+    """Validate the prerequisite graph and report any cycles."""
+    db = open_connection()
+    try:
+        migrate_db(db)
+        graph = _load_prereq_graph(db)
+        codes = {
+            row["course_id"]: row["course_code"]
+            for row in db.execute("SELECT course_id, course_code FROM Course")
+        }
+    finally:
+        db.close()
+
+    longest = max((len(c) for c in graph["closure"].values()), default=0)
+    click.echo(f"{len(graph['direct'])} courses with prerequisites; longest chain needs {longest} course(s).")
+    if graph["cycles"]:
+        for cycle in graph["cycles"]:
+            click.echo("Cycle: " + " -> ".join(codes.get(c, str(c)) for c in cycle), err=True)
+        raise click.ClickException(f"{len(graph['cycles'])} prerequisite cycle(s) found.")
+    click.echo("No cycles.")
+
+def passed_courses(db, student_id):
+    """
+    Set of course_ids the student has a passing grade in.
+    """
+    rows = db.execute(
+        """
+        SELECT DISTINCT cs.course_id
+        FROM Enrollment e
+        JOIN CourseSelection cs ON e.selection_id = cs.selection_id
+        WHERE e.student_id = ? AND e.grade >= ?
+        """,
+        (student_id, PASSING_GRADE),
+    ).fetchall()
+    return {row["course_id"] for row in rows}
+
+def annotate_eligibility(db, student_id, rows):
+    """
+    Takes catalog rows with selection_id, course_id, capacity and enrolled and
+    returns dicts with 'seats_left', 'missing_prereqs' (course codes),
+    'conflict' and 'eligible' added. Works on the whole list at once: one
+    query for passed courses, one batched schedule load, then set and mask ops.
+    """
+    rows = [dict(row) for row in rows]
+    closure = get_prereq_graph(db)["closure"]
+    passed = passed_courses(db, student_id)
+    timetable = student_timetable_mask(db, student_id)
+    masks = get_section_masks(db, [row["selection_id"] for row in rows])
+
+    missing = {
+        row["course_id"]: closure.get(row["course_id"], frozenset()) - passed
+        for row in rows
+    }
+    wanted = set().union(*missing.values())
+    codes = {}
+    if wanted:
+        codes = {
+            r["course_id"]: r["course_code"]
+            for r in db.execute(
+                "SELECT course_id, course_code FROM Course "
+                "WHERE course_id IN (SELECT value FROM json_each(?))",
+                (json.dumps(sorted(wanted)),),
+            )
+        }
+
+    for row in rows:
+        row["seats_left"] = max(row["capacity"] - row["enrolled"], 0)
+        row["missing_prereqs"] = sorted(
+            codes.get(c, str(c)) for c in missing[row["course_id"]]
+        )
+        row["conflict"] = bool(masks[row["selection_id"]] & timetable)
+        row["eligible"] = (
+            row["seats_left"] > 0 and not row["missing_prereqs"] and not row["conflict"]
+        )
+    return rows
+
+# ENROLLMENT
+ENROLL_MAX_RETRIES = 5
+ENROLL_RETRY_DELAY = 0.01  # seconds, doubled on each retry
+
+ENROLL_MESSAGES = {
+    "missing": "⚠ Section not found.",
+    "duplicate": "⚠ You are already enrolled in this section.",
+    "full": "⚠ This section is FULL. Please choose another.",
+    "prereq": "⚠ Prerequisite not met for this course.",
+    "conflict": "⚠ Schedule conflict with an existing class.",
+}
+
+def _is_busy_error(e):
+    msg = str(e).lower()
+    return "locked" in msg or "busy" in msg
+
+def enroll_student(db, student_id, selection_id):
+    """
+    Enroll a student in a section. Prerequisites and time conflicts only depend on
+    the student's own rows, so they are checked up front; the seat check and the
+    insert are a single conditional INSERT inside a short BEGIN IMMEDIATE, so
+    concurrent requests can never oversubscribe a section.
+    Returns 'enrolled' or one of the ENROLL_MESSAGES keys.
+    """
+    section = db.execute(
+        """
+        SELECT course_id, capacity, enrolled_count
+        FROM CourseSelection
+        WHERE selection_id = ?
+        """,
+        (selection_id,),
+    ).fetchone()
+    if not section:
+        return "missing"
+
+    # Cheap early exit; the authoritative check happens in the INSERT below
+    if section["enrolled_count"] >= section["capacity"]:
+        return "full"
+
+    # Prerequisite check over the whole chain, not just direct prerequisites
+    if missing_prerequisites(db, student_id, section["course_id"]):
+        return "prereq"
+
+    # Time conflict check against the student's weekly timetable
+    new_mask = get_section_masks(db, [selection_id])[selection_id]
+    if new_mask & student_timetable_mask(db, student_id):
+        return "conflict"
+
+    for attempt in range(ENROLL_MAX_RETRIES + 1):
+        try:
+            db.execute("BEGIN IMMEDIATE")
+            cur = db.execute(
+                """
+                INSERT INTO Enrollment (student_id, selection_id, enrollment_date)
+                SELECT ?, ?, DATE('now')
+                WHERE (SELECT enrolled_count < capacity
+                       FROM CourseSelection WHERE selection_id = ?)
+                  AND NOT EXISTS (SELECT 1 FROM Enrollment
+                                  WHERE student_id = ? AND selection_id = ?)
+                """,
+                (student_id, selection_id, selection_id, student_id, selection_id),
+            )
+            db.commit()
+            break
+        except sqlite3.OperationalError as e:
+            if db.in_transaction:
+                db.rollback()
+            if not _is_busy_error(e):
+                raise
+            if attempt == ENROLL_MAX_RETRIES:
+                inc_counter("sqlite_busy_failures_total", operation="enroll")
+                raise
+            inc_counter("sqlite_busy_retries_total", operation="enroll")
+            time.sleep(ENROLL_RETRY_DELAY * (2 ** attempt) * random.uniform(0.5, 1.5))
+
+    if cur.rowcount == 1:
+        return "enrolled"
+
+    already = db.execute(
+        "SELECT 1 FROM Enrollment WHERE student_id = ? AND selection_id = ?",
+        (student_id, selection_id),
+    ).fetchone()
+    return "duplicate" if already else "full"
+
+@app.cli.command("bench-enroll")
+@click.option("--students", default=2000, show_default=True, help="Parallel enrollment attempts.")
+@click.option("--capacity", default=50, show_default=True, help="Seats in the contested section.")
+@click.option("--threads", default=16, show_default=True, help="Worker threads.")
+def bench_enroll_command(students, capacity, threads):
+    """Race many enrollments into one section on a scratch copy of the database."""
+    scratch_dir = tempfile.mkdtemp()
+    scratch = os.path.join(scratch_dir, "bench.db")
+
+    src = open_connection()
+    dst = open_connection(scratch)
+    try:
+        migrate_db(src)
+        src.backup(dst)
+
+        course_id = dst.execute("SELECT MIN(course_id) AS c FROM Course").fetchone()["c"]
+        selection_id = dst.execute(
+            "INSERT INTO CourseSelection (course_id, capacity) VALUES (?, ?)",
+            (course_id, capacity),
+        ).lastrowid
+        dst.executemany(
+            """
+            INSERT INTO Student (first_name, last_name, email, status)
+            VALUES ('Bench', ?, ?, 'Active')
+            """,
+            [(f"Student{i}", f"bench{i}@example.edu") for i in range(students)],
+        )
+        first_sid = dst.execute("SELECT MAX(student_id) AS m FROM Student").fetchone()["m"] - students + 1
+        dst.commit()
+    finally:
+        src.close()
+        dst.close()
+
+    local = threading.local()
+    outcomes = {}
+    outcomes_lock = threading.Lock()
+
+    def attempt(student_id):
+        if not hasattr(local, "db"):
+            local.db = open_connection(scratch)
+        with app.app_context():
+            result = enroll_student(local.db, student_id, selection_id)
+        with outcomes_lock:
+            outcomes[result] = outcomes.get(result, 0) + 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(attempt, range(first_sid, first_sid + students)))
+    elapsed = time.perf_counter() - started
+
+    db = open_connection(scratch)
+    try:
+        actual = db.execute(
+            "SELECT COUNT(*) AS c FROM Enrollment WHERE selection_id = ?", (selection_id,)
+        ).fetchone()["c"]
+        counter = db.execute(
+            "SELECT enrolled_count FROM CourseSelection WHERE selection_id = ?", (selection_id,)
+        ).fetchone()["enrolled_count"]
+    finally:
+        db.close()
+        shutil.rmtree(scratch_dir, ignore_errors=True)
+
+    click.echo(f"{students} attempts on {threads} threads in {elapsed:.2f}s "
+               f"({students / elapsed:.0f} enrollments/s)")
+    click.echo("Outcomes: " + ", ".join(f"{k}={v}" for k, v in sorted(outcomes.items())))
+    click.echo(f"Seats: capacity={capacity} enrolled={actual} counter={counter}")
+    if actual > capacity or counter != actual:
+        raise click.ClickException("Section was oversubscribed or its counter drifted.")
+    click.echo("No oversubscription.")
+
+# TRANSCRIPTS
+# A student's transcript is built once and stored in TranscriptSummary; the
+# Enrollment/Course triggers delete the row whenever something on it changes.
+
+def term_label(enrollment_date):
+    """
+    'YYYY-MM-DD' -> 'Spring 2025' / 'Summer 2025' / 'Fall 2025'.
+    There is no term table, so the enrollment date stands in for it.
+    """
+    if not enrollment_date:
+        return "Unscheduled"
+    year, month = int(enrollment_date[:4]), int(enrollment_date[5:7])
+    season = "Spring" if month <= 5 else "Summer" if month <= 7 else "Fall"
+    return f"{season} {year}"
+
+def _weighted_gpa(rows):
+    graded = [r for r in rows if r["grade"] is not None and r["credit"]]
+    credits = sum(r["credit"] for r in graded)
+    if not credits:
+        return None, 0
+    points = sum(r["grade"] * r["credit"] for r in graded)
+    return points / credits / 25.0, credits
+
+def compute_transcript(db, student_id):
+    """
+    Course history, credit-weighted GPA and per-term summaries for one student.
+    """
+    rows = db.execute(
+        """
+        SELECT c.course_code,
+               c.course_name,
+               c.credit,
+               e.grade,
+               e.enrollment_date
+        FROM Enrollment e
+        JOIN CourseSelection cs ON e.selection_id = cs.selection_id
+        JOIN Course c ON cs.course_id = c.course_id
+        WHERE e.student_id = ?
+        ORDER BY e.enrollment_date, c.course_code
+        """,
+        (student_id,),
+    ).fetchall()
+    rows = [dict(r) for r in rows]
+
+    terms = {}
+    for r in rows:
+        r["term"] = term_label(r["enrollment_date"])
+        terms.setdefault(r["term"], []).append(r)
+
+    term_summaries = []
+    for term, term_rows in terms.items():
+        gpa, graded_credits = _weighted_gpa(term_rows)
+        term_summaries.append({
+            "term": term,
+            "credits": sum(r["credit"] or 0 for r in term_rows),
+            "graded_credits": graded_credits,
+            "gpa": gpa,
+        })
+
+    gpa, graded_credits = _weighted_gpa(rows)
+    return {
+        "rows": sorted(rows, key=lambda r: r["course_code"]),
+        "terms": term_summaries,
+        "total_credits": sum(r["credit"] or 0 for r in rows),
+        "graded_credits": graded_credits,
+        "gpa": gpa,
+    }
+
+def get_transcript(db, student_id):
+    """
+    The student's transcript summary: a single-row lookup, rebuilt on a miss.
+    """
+    row = db.execute(
+        "SELECT payload FROM TranscriptSummary WHERE student_id = ?",
+        (student_id,),
+    ).fetchone()
+    if row:
+        return json.loads(row["payload"])
+
+    # Read and store in one transaction: if a grade is committed in between,
+    # the INSERT fails with a stale snapshot and the summary just isn't stored
+    db.execute("BEGIN")
+    transcript = compute_transcript(db, student_id)
+    try:
+        db.execute(
+            """
+            INSERT OR REPLACE INTO TranscriptSummary
+                (student_id, gpa, total_credits, graded_credits, payload, computed_at)
+            VALUES (?, ?, ?, ?, ?, DATETIME('now'))
+            """,
+            (
+                student_id,
+                transcript["gpa"],
+                transcript["total_credits"],
+                transcript["graded_credits"],
+                json.dumps(transcript),
+            ),
+        )
+        db.commit()
+    except sqlite3.OperationalError as e:
+        db.rollback()
+        if not _is_busy_error(e):
+            raise
+        inc_counter("sqlite_busy_failures_total", operation="transcript_summary")
+    return transcript
+
+# SYNTHETIC DATA
+# `flask generate-data` grows the demo database into a full-size campus for
+# benchmarking. Everything is drawn from one seeded Random, so the same options
+# always produce the same database.
+
+FIRST_NAMES = [
+    "James", "Mary", "Robert", "Patricia", "John", "Jennifer", "Michael", "Linda",
+    "David", "Elizabeth", "William", "Barbara", "Richard", "Susan", "Joseph", "Jessica",
+    "Thomas", "Karen", "Carlos", "Sarah", "Daniel", "Lisa", "Matthew", "Nancy",
+    "Anthony", "Sofia", "Mark", "Aisha", "Wei", "Priya", "Omar", "Yuki",
+    "Mateo", "Fatima", "Liam", "Chloe", "Noah", "Amara", "Ethan", "Hana",
+]
+LAST_NAMES = [
+    "Smith", "Johnson", "Williams", "Brown", "Jones", "Garcia", "Miller", "Davis",
+    "Rodriguez", "Martinez", "Hernandez", "Lopez", "Gonzalez", "Wilson", "Anderson",
+    "Thomas", "Taylor", "Moore", "Jackson", "Martin", "Lee", "Perez", "Thompson",
+    "White", "Harris", "Sanchez", "Clark", "Ramirez", "Lewis", "Robinson", "Walker",
+    "Young", "Allen", "King", "Wright", "Nguyen", "Patel", "Kim", "Chen", "Okafor",
+]
+# Department name -> course code prefix; the first four are the demo departments
+DEPARTMENTS = {
+    "Computer Science": "CS", "Mathematics": "MATH", "Business": "BUS", "Biology": "BIO",
+    "Physics": "PHYS", "Chemistry": "CHEM", "English": "ENGL", "History": "HIST",
+    "Psychology": "PSY", "Economics": "ECON", "Philosophy": "PHIL", "Art": "ART",
+    "Music": "MUS", "Sociology": "SOC", "Political Science": "POLS",
+    "Engineering": "ENGR", "Nursing": "NURS", "Education": "EDUC",
+    "Linguistics": "LING", "Statistics": "STAT",
+}
+COURSE_LEVELS = {1: "Introduction to", 2: "Intermediate", 3: "Advanced", 4: "Seminar in"}
+COURSE_TOPICS = [
+    "Foundations", "Methods", "Theory", "Systems", "Analysis", "Design", "Practice",
+    "Research", "Applications", "Perspectives", "Laboratory", "Topics",
+]
+POSITIONS = [
+    ("Professor", 95000, 140000), ("Associate Prof", 80000, 105000),
+    ("Assistant Prof", 68000, 88000), ("Lecturer", 52000, 70000),
+]
+# Registrar grid: (days, start, end). MWF hours, TTh blocks, evening and Friday labs
+MEETING_PATTERNS = (
+    [(("M", "W", "F"), f"{h:02d}:00", f"{h:02d}:50") for h in range(8, 17)]
+    + [(("T", "Th"), start, end) for start, end in [
+        ("08:00", "09:15"), ("09:30", "10:45"), ("11:00", "12:15"),
+        ("12:30", "13:45"), ("14:00", "15:15"), ("15:30", "16:45"),
+    ]]
+    + [(("M", "W"), "17:30", "18:45"), (("T", "Th"), "17:30", "18:45")]
+    + [(("F",), "09:00", "12:00"), (("F",), "13:00", "16:00")]
+)
+WEEKDAY_OFFSETS = {"M": 0, "T": 1, "W": 2, "Th": 3, "F": 4}
+WEEKS_PER_TERM = 15
+ATTENDANCE_STATUSES = (["Present", "Late", "Absent"], [85, 7, 8])
+BULK_LOAD_PRAGMAS = {
+    "journal_mode": "OFF",
+    "synchronous": "OFF",
+    "locking_mode": "EXCLUSIVE",
+    "temp_store": "MEMORY",
+    "cache_size": -262144,
+    "foreign_keys": "OFF",
+}
+
+def _first_weekday(year, month, day, weekday=0):
+    d = date(year, month, day)
+    return d + timedelta(days=(weekday - d.weekday()) % 7)
+
+def _month_end(year, month):
+    return date(year + month // 12, month % 12 + 1, 1) - timedelta(days=1)
+
+def _next_id(db, table, pk):
+    return db.execute(f"SELECT COALESCE(MAX({pk}), 0) + 1 FROM {table}").fetchone()[0]
+
+def _suspend_derived_objects(db):
+    """
+    Drop every trigger and secondary index so bulk inserts skip per-row upkeep.
+    Returns the SQL that recreates them, indexes first.
+    """
+    rows = db.execute(
+        """
+        SELECT type, name, sql FROM sqlite_master
+        WHERE type IN ('index', 'trigger') AND sql IS NOT NULL
+        ORDER BY type
+        """
+    ).fetchall()
+    for row in rows:
+        db.execute(f'DROP {row["type"].upper()} "{row["name"]}"')
+    db.commit()
+    return [row["sql"] for row in rows]
+
+def generate_campus(db, rng, students, courses, sections, instructors,
+                    enrollments, attendance, start_year, years, report=None):
+    """
+    Bulk-load a synthetic campus into an initialized database. Triggers and
+    indexes are dropped for the load and the derived tables rebuilt at the end.
+    Returns {table: rows inserted}.
+    """
+    report = report or (lambda msg: None)
+    counts = {}
+    started = time.time()
+
+    def insert(table, columns, rows):
+        placeholders = ",".join("?" * len(columns))
+        cur = db.executemany(
+            f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders})", rows
+        )
+        counts[table] = counts.get(table, 0) + cur.rowcount
+        report(f"  {table}: {counts[table]} rows ({time.time() - started:.1f}s)")
+
+    recreate = _suspend_derived_objects(db)
+    for name, value in BULK_LOAD_PRAGMAS.items():
+        db.execute(f"PRAGMA {name} = {value}")
+    db.execute("BEGIN")
+
+    # Terms: spring and fall of each year; the last one is in progress
+    terms = []
+    for year in range(start_year, start_year + years):
+        terms.append(_first_weekday(year, 1, 10))
+        terms.append(_first_weekday(year, 8, 24))
+    current_term = len(terms) - 1
+
+    # Departments, buildings and rooms
+    existing_depts = {row[0] for row in db.execute("SELECT department_name FROM Department")}
+    insert("Department", ["department_name"],
+           [(name,) for name in DEPARTMENTS if name not in existing_depts])
+    dept_ids = {
+        row["department_name"]: row["department_id"]
+        for row in db.execute("SELECT department_id, department_name FROM Department")
+    }
+    depts = [(dept_ids[name], name, prefix) for name, prefix in DEPARTMENTS.items()]
+
+    # Enough rooms that every section gets its own room/time slot
+    room_count = math.ceil(sections / len(MEETING_PATTERNS) * 1.2)
+    building_count = math.ceil(room_count / 40)
+    first_building = _next_id(db, "Building", "building_id")
+    insert("Building", ["building_id", "building_name"],
+           ((first_building + i, f"{rng.choice(LAST_NAMES)} Hall {i + 1}")
+            for i in range(building_count)))
+    first_room = _next_id(db, "Room", "room_id")
+    room_ids = list(range(first_room, first_room + room_count))
+    insert("Room", ["room_id", "room_number", "building_id"],
+           ((room_id, f"R{i % 40 // 10 + 1}{i % 10:02d}", first_building + i // 40)
+            for i, room_id in enumerate(room_ids)))
+
+    # Instructors, their department history, reviews and payroll
+    first_employee = _next_id(db, "Employee", "employee_id")
+    employees = []
+    for i in range(instructors):
+        dept_id = depts[i % len(depts)][0]
+        title, low, high = rng.choices(POSITIONS, weights=[2, 3, 3, 4])[0]
+        hired = date(rng.randrange(1995, start_year), rng.randrange(1, 13), rng.randrange(1, 29))
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        employees.append((
+            first_employee + i, first, last,
+            f"{first[0]}{last}.{first_employee + i}@example.edu".lower(),
+            title, dept_id, round(rng.uniform(low, high), -2), rng.choice(room_ids),
+            hired.isoformat(),
+        ))
+    insert("Employee", ["employee_id", "first_name", "last_name", "email", "position_title",
+                        "department_id", "salary", "office_id", "hire_date"], employees)
+    instructors_by_dept = {}
+    for e in employees:
+        instructors_by_dept.setdefault(e[5], []).append(e[0])
+
+    def assignments():
+        for e in employees:
+            hired = date.fromisoformat(e[8])
+            if rng.random() < 0.1:
+                moved = hired + timedelta(days=rng.randrange(365, 3650))
+                if moved.year < start_year:
+                    yield (e[0], rng.choice(depts)[0], e[8], moved.isoformat())
+                    yield (e[0], e[5], moved.isoformat(), None)
+                    continue
+            yield (e[0], e[5], e[8], None)
+    insert("EmployeeDepartmentAssignment",
+           ["employee_id", "department_id", "start_date", "end_date"], assignments())
+
+    insert("PerformanceReview", ["employee_id", "review_date", "rating", "comments"],
+           ((e[0], date(year, 3, rng.randrange(1, 29)).isoformat(),
+             rng.choices([1, 2, 3, 4, 5], weights=[1, 3, 12, 10, 5])[0], "Annual review")
+            for e in employees for year in range(start_year, start_year + years)))
+
+    def payroll():
+        for e in employees:
+            salary = e[6]
+            for year in range(start_year, start_year + years):
+                for month in range(1, 13):
+                    gross = round(salary / 12, 2)
+                    deductions = round(gross * rng.uniform(0.22, 0.30), 2)
+                    yield (e[0], _month_end(year, month).isoformat(), gross,
+                           deductions, round(gross - deductions, 2), "Monthly salary")
+                salary = round(salary * 1.03, -2)
+    insert("Payroll", ["employee_id", "pay_date", "gross_amount", "deductions",
+                       "net_amount", "notes"], payroll())
+
+    existing_budgets = {
+        (row[0], row[1])
+        for row in db.execute("SELECT department_id, fiscal_year FROM DepartmentBudget")
+    }
+    def budgets():
+        for dept_id, _, _ in depts:
+            for year in range(start_year, start_year + years):
+                fiscal_year = f"{year}-{year + 1}"
+                if (dept_id, fiscal_year) in existing_budgets:
+                    continue
+                allocated = round(rng.uniform(100000, 400000), -3)
+                yield (dept_id, fiscal_year, allocated,
+                       round(allocated * rng.uniform(0.3, 1.0), -2))
+    insert("DepartmentBudget",
+           ["department_id", "fiscal_year", "allocated_amount", "spent_amount"], budgets())
+
+    # Courses per department and level, each level requiring the one below
+    used_codes = {row[0] for row in db.execute("SELECT course_code FROM Course")}
+    first_course = _next_id(db, "Course", "course_id")
+    course_rows = []
+    by_level = {}
+    for i in range(courses):
+        dept_id, dept_name, prefix = depts[i % len(depts)]
+        level = rng.choices([1, 2, 3, 4], weights=[4, 3, 2, 1])[0]
+        number = level * 100 + rng.randrange(100)
+        while f"{prefix}{number}" in used_codes:
+            number += 1
+        code = f"{prefix}{number}"
+        used_codes.add(code)
+        course_id = first_course + i
+        course_rows.append((
+            course_id, code,
+            f"{COURSE_LEVELS[level]} {dept_name} {rng.choice(COURSE_TOPICS)}",
+            rng.choices([1, 3, 4], weights=[1, 7, 2])[0], dept_id, level,
+        ))
+        by_level.setdefault((dept_id, level), []).append(course_id)
+    insert("Course", ["course_id", "course_code", "course_name", "credit", "department_id"],
+           (row[:5] for row in course_rows))
+
+    def prerequisites():
+        for course_id, _, _, _, dept_id, level in course_rows:
+            lower = by_level.get((dept_id, level - 1))
+            if lower and rng.random() < 0.7:
+                for prereq in rng.sample(lower, min(len(lower), rng.choice([1, 1, 2]))):
+                    yield (course_id, prereq)
+    insert("CoursePrerequisite", ["course_id", "prereq_course_id"], prerequisites())
+
+    # Sections: intro courses get more of them, and no room is double-booked
+    slots = [(room, p) for room in room_ids for p in range(len(MEETING_PATTERNS))]
+    rng.shuffle(slots)
+    per_section = enrollments / max(sections, 1)
+    first_section = _next_id(db, "CourseSelection", "selection_id")
+    course_weights = [5 - row[5] for row in course_rows]
+    section_rows = []
+    for i, course in enumerate(rng.choices(course_rows, weights=course_weights, k=sections)):
+        room_id, pattern = slots[i]
+        dept_pool = instructors_by_dept.get(course[4]) or [e[0] for e in employees]
+        section_rows.append((
+            first_section + i, course[0], rng.choice(dept_pool), room_id,
+            max(10, round(per_section * rng.uniform(1.0, 1.5))), pattern,
+        ))
+    insert("CourseSelection",
+           ["selection_id", "course_id", "instructor_id", "room_id", "capacity"],
+           (row[:5] for row in section_rows))
+    insert("CourseSchedule", ["selection_id", "day_code", "start_time", "end_time"],
+           ((row[0], day, MEETING_PATTERNS[row[5]][1], MEETING_PATTERNS[row[5]][2])
+            for row in section_rows for day in MEETING_PATTERNS[row[5]][0]))
+
+    # Students, mostly admitted, with a few applications still in the queue
+    first_student = _next_id(db, "Student", "student_id")
+    student_rows = []
+    for i in range(students):
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        status = rng.choices(["Full-time", "Part-time", "Pending", "Denied"],
+                             weights=[70, 25, 4, 1])[0]
+        start_term = rng.randrange(len(terms))
+        applied = terms[start_term] - timedelta(days=rng.randrange(30, 200))
+        student_rows.append((
+            first_student + i, first, last,
+            f"{first[0]}{last}.{first_student + i}@students.example.edu".lower(),
+            rng.choice(depts)[1], status,
+            round(min(4.0, max(2.0, rng.gauss(3.2, 0.4))), 2) if status == "Pending" else None,
+            applied.isoformat(), start_term,
+        ))
+    insert("Student", ["student_id", "first_name", "last_name", "email", "major", "status",
+                       "gpa", "applied_on"], (row[:8] for row in student_rows))
+    admitted = [row for row in student_rows if row[5] in ("Full-time", "Part-time")]
+    first_user = _next_id(db, "UserAccount", "user_id")
+    insert("UserAccount", ["user_id", "username", "password", "role", "student_id"],
+           ((first_user + i, f"student{row[0]}", "password", "student", row[0])
+            for i, row in enumerate(admitted)))
+    insert("UserAccount", ["user_id", "username", "password", "role", "employee_id"],
+           ((first_user + len(admitted) + i, f"instructor{e[0]}", "password", "instructor", e[0])
+            for i, e in enumerate(employees)))
+
+    # Enrollments: no repeated course, no clash in the weekly timetable, no section
+    # over capacity; grades for finished terms, none for the current one
+    pattern_masks = [
+        meeting_mask([{"day_code": d, "start_time": start, "end_time": end} for d in days])
+        for days, start, end in MEETING_PATTERNS
+    ]
+    seats = {row[0]: row[4] for row in section_rows}
+    section_index = {row[0]: row for row in section_rows}
+    section_ids = list(seats)
+    wanted = enrollments // max(len(admitted), 1)
+    extra = enrollments - wanted * len(admitted)
+
+    def enrollment_rows():
+        for n, student in enumerate(admitted):
+            target = wanted + (n < extra)
+            mask, taken_courses, picked = 0, set(), []
+            for _ in range(target * 8):
+                if len(picked) == target:
+                    break
+                sid = rng.choice(section_ids)
+                section = section_index[sid]
+                if (seats[sid] <= 0 or section[1] in taken_courses
+                        or mask & pattern_masks[section[5]]):
+                    continue
+                seats[sid] -= 1
+                mask |= pattern_masks[section[5]]
+                taken_courses.add(section[1])
+                picked.append(sid)
+            span = current_term - student[8] + 1
+            ability = rng.gauss(82, 7)
+            for k, sid in enumerate(picked):
+                term = student[8] + k * span // max(len(picked), 1)
+                grade = None
+                if term < current_term:
+                    grade = round(min(100, max(35, rng.gauss(ability, 8))))
+                enrolled_on = terms[term] + timedelta(days=rng.randrange(7))
+                yield (student[0], sid, enrolled_on.isoformat(), grade)
+    insert("Enrollment", ["student_id", "selection_id", "enrollment_date", "grade"],
+           enrollment_rows())
+    db.commit()
+
+    # Attendance is by far the biggest table, so it is built set-based in SQL:
+    # the first N class meetings of each enrollment's term, with the status
+    # rolled from a hash of (enrollment, meeting, seed) so reruns match
+    db.executescript("""
+        CREATE TEMP TABLE gen_term_day (day TEXT PRIMARY KEY, term INTEGER) WITHOUT ROWID;
+        CREATE TEMP TABLE gen_section (selection_id INTEGER PRIMARY KEY, pattern INTEGER);
+        CREATE TEMP TABLE gen_meeting (
+            term INTEGER, pattern INTEGER, seq INTEGER, day TEXT,
+            PRIMARY KEY (term, pattern, seq)
+        ) WITHOUT ROWID;
+    """)
+    db.executemany(
+        "INSERT INTO gen_term_day VALUES (?, ?)",
+        [((start + timedelta(days=d)).isoformat(), t)
+         for t, start in enumerate(terms) for d in range(7)],
+    )
+    db.executemany("INSERT INTO gen_section VALUES (?, ?)",
+                   [(row[0], row[5]) for row in section_rows])
+    db.executemany(
+        "INSERT INTO gen_meeting VALUES (?, ?, ?, ?)",
+        [(t, p, seq, (start + timedelta(weeks=w, days=WEEKDAY_OFFSETS[d])).isoformat())
+         for t, start in enumerate(terms)
+         for p, (days, _, _) in enumerate(MEETING_PATTERNS)
+         for seq, (w, d) in enumerate((w, d) for w in range(WEEKS_PER_TERM) for d in days)],
+    )
+
+    per_enrollment = attendance / max(counts.get("Enrollment", 0), 1)
+    statuses, status_weights = ATTENDANCE_STATUSES
+    cases, threshold = [], 0
+    for status, weight in zip(statuses, status_weights):
+        threshold += weight
+        cases.append(f"WHEN roll < {threshold * 100 // sum(status_weights)} THEN '{status}'")
+    salt = rng.randrange(1000003)
+    cur = db.execute(
+        f"""
+        INSERT INTO Attendance (student_id, selection_id, date, status)
+        SELECT student_id, selection_id, day, CASE {" ".join(cases)} END
+        FROM (
+            SELECT e.student_id, e.selection_id, m.day,
+                   ((e.enrollment_id * 7919 + m.seq * 104729 + :salt) % 1000003)
+                       * 2654435761 % 4294967291 % 100 AS roll
+            FROM Enrollment e
+            JOIN gen_term_day t ON t.day = e.enrollment_date
+            JOIN gen_section s ON s.selection_id = e.selection_id
+            JOIN gen_meeting m ON m.term = t.term AND m.pattern = s.pattern
+            WHERE e.student_id >= :first_student
+              AND m.seq < :base + ((e.enrollment_id * 40503 + :salt) % 1000 < :frac)
+        )
+        """,
+        {"salt": salt, "first_student": first_student,
+         "base": int(per_enrollment), "frac": round(per_enrollment % 1 * 1000)},
+    )
+    counts["Attendance"] = cur.rowcount
+    db.commit()
+    db.executescript("DROP TABLE temp.gen_term_day; DROP TABLE temp.gen_section; "
+                     "DROP TABLE temp.gen_meeting;")
+    report(f"  Attendance: {counts['Attendance']} rows ({time.time() - started:.1f}s)")
+
+    # Put back indexes and triggers, then rebuild everything they maintain
+    report(f"  recreating {len(recreate)} indexes and triggers")
+    for sql in recreate:
+        db.execute(sql)
+    db.commit()
+    reconcile_enrolled_counts(db)
+    reconcile_grade_totals(db)
+    rebuild_attendance_rollup(db)
+    rebuild_search_index(db)
+    # Bulk-loaded tables didn't bump their change counters
+    db.execute("UPDATE TableVersion SET version = version + 1")
+    db.execute("ANALYZE")
+    db.commit()
+    report(f"  derived tables rebuilt ({time.time() - started:.1f}s)")
+    return counts
+
+@app.cli.command("generate-data")
+@click.option("--students", default=100000, show_default=True)
+@click.option("--courses", default=2000, show_default=True)
+@click.option("--sections", default=10000, show_default=True)
+@click.option("--instructors", default=None, type=int, help="Defaults to sections / 4.")
+@click.option("--enrollments", default=1000000, show_default=True)
+@click.option("--attendance", default=20000000, show_default=True, help="Attendance rows.")
+@click.option("--start-year", default=2022, show_default=True, help="First year of history.")
+@click.option("--years", default=4, show_default=True, help="Years of terms and payroll.")
+@click.option("--seed", default=1, show_default=True)
+@click.option("--output", default=None, help="Database file to write. Defaults to DATABASE.")
+@click.option("--yes", is_flag=True, help="Overwrite the output file without asking.")
+def generate_data_command(students, courses, sections, instructors, enrollments,
+                          attendance, start_year, years, seed, output, yes):
+    """Build a large synthetic campus database (demo rows included) for benchmarking."""
+    output = output or DATABASE
+    if os.path.exists(output) and not yes:
+        click.confirm(f"{output} will be replaced. Continue?", abort=True)
+    if instructors is None:
+        instructors = max(1, sections // 4)
+
+    # Built next to the target and swapped in at the end, so a failed run
+    # leaves the existing database alone
+    scratch = output + ".generating"
+    for path in (scratch, scratch + "-wal", scratch + "-shm"):
+        if os.path.exists(path):
+            os.remove(path)
+
+    started = time.time()
+    db = open_connection(scratch)
+    try:
+        init_db(db)
+        counts = generate_campus(
+            db, random.Random(seed), students, courses, sections, instructors,
+            enrollments, attendance, start_year, years, report=click.echo,
+        )
+    finally:
+        db.close()
+
+    # Back to the normal profile (WAL) now that loading is done
+    db = open_connection(scratch)
+    db.close()
+    for path in (output + "-wal", output + "-shm"):
+        if os.path.exists(path):
+            os.remove(path)
+    os.replace(scratch, output)
+
+    click.echo(f"Generated {output} in {time.time() - started:.1f}s (seed {seed}): "
+               + ", ".join(f"{table}={n}" for table, n in counts.items()))
 
 # AUTH HELPER
 def login_required(role=None):
@@ -189,32 +2689,31 @@ def apply():
             (first, last, email, major),
         )
         db.commit()
+        invalidate_admin_aggregates()
         flash("Application submitted! Await admin approval.")
         return redirect(url_for("login"))
 
     return render_template("apply.html")
 
 # ADMIN
-@app.route("/admin/dashboard")
-@login_required(role="admin")
-def admin_dashboard():
-    db = get_db()
+def _load_dashboard_stats(db):
+    stats = {}
 
     # All students except pending ones
-    student_count = db.execute(
+    stats["student_count"] = db.execute(
         "SELECT COUNT(*) AS c FROM Student WHERE status='Active'"
     ).fetchone()["c"]
 
     # Pending applicants count
-    applicant_count = db.execute(
+    stats["applicant_count"] = db.execute(
         "SELECT COUNT(*) AS c FROM Student WHERE status='Pending'"
     ).fetchone()["c"]
 
-    course_count = db.execute("SELECT COUNT(*) AS c FROM Course").fetchone()["c"]
-    instructor_count = db.execute("SELECT COUNT(*) AS c FROM Employee").fetchone()["c"]
-    enrollment_count = db.execute("SELECT COUNT(*) AS c FROM Enrollment").fetchone()["c"]
+    stats["course_count"] = db.execute("SELECT COUNT(*) AS c FROM Course").fetchone()["c"]
+    stats["instructor_count"] = db.execute("SELECT COUNT(*) AS c FROM Employee").fetchone()["c"]
+    stats["enrollment_count"] = db.execute("SELECT COUNT(*) AS c FROM Enrollment").fetchone()["c"]
 
-    dept_stats = db.execute(
+    stats["dept_stats"] = [dict(row) for row in db.execute(
         """
         SELECT d.department_name,
                COUNT(s.student_id) AS student_count
@@ -223,106 +2722,318 @@ def admin_dashboard():
         GROUP BY d.department_name
         ORDER BY d.department_name
         """
-    ).fetchall()
+    )]
+
+    stats["max_students"] = max([row["student_count"] for row in stats["dept_stats"]] or [1])
+    return stats
 
-    max_students = max([row["student_count"] for row in dept_stats] or [1])
+def invalidate_admin_aggregates():
+    invalidate_cache("dashboard", "student_total")
+
+@app.route("/admin/dashboard")
+@login_required(role="admin")
+def admin_dashboard():
+    # A cache hit needs no database access at all
+    stats, loaded_at = cached(
+        "dashboard",
+        lambda: _load_dashboard_stats(get_db()),
+        ttl=app.config["DASHBOARD_CACHE_TTL"],
+    )
 
     return render_template(
         "admin_dashboard.html",
-        student_count=student_count,
-        applicant_count=applicant_count,
-        course_count=course_count,
-        instructor_count=instructor_count,
-        enrollment_count=enrollment_count,
-        dept_stats=dept_stats,
-        max_students=max_students,
+        **stats,
+        stats_loaded_at=time.strftime("%H:%M:%S", time.localtime(loaded_at)),
+        stats_age=int(time.time() - loaded_at),
+        pool=pool_stats(),
     )
 
 # ADMIN: Review Student Applications
+def _unique_username(email, student_id, taken):
+    """
+    Email prefix as the username, with the first free numeric suffix on collision.
+    """
+    base = re.sub(r"[^a-z0-9._-]", "", (email or "").split("@")[0].lower()) or f"student{student_id}"
+    username = base
+    n = 2
+    while username in taken:
+        username = f"{base}{n}"
+        n += 1
+    taken.add(username)
+    return username
+
+def decide_applications(db, decision, student_ids=None, major=None):
+    """
+    Accept or deny pending applications in one transaction, either the given
+    student_ids or every pending applicant (optionally for one major).
+    Accepting creates a login for each student that doesn't have one yet.
+    Returns how many applications were decided.
+    """
+    new_status = {"accept": "Active", "deny": "Denied"}[decision]
+
+    where = ["s.status = 'Pending'"]
+    params = []
+    if student_ids is not None:
+        where.append("s.student_id IN (SELECT value FROM json_each(?))")
+        params.append(json.dumps(list(student_ids)))
+    if major:
+        where.append("s.major = ?")
+        params.append(major)
+
+    db.execute("BEGIN IMMEDIATE")
+    try:
+        targets = db.execute(
+            f"""
+            SELECT s.student_id, s.email,
+                   EXISTS (SELECT 1 FROM UserAccount u
+                           WHERE u.student_id = s.student_id) AS has_account
+            FROM Student s
+            WHERE {' AND '.join(where)}
+            """,
+            params,
+        ).fetchall()
+
+        if decision == "accept":
+            taken = {row["username"] for row in db.execute("SELECT username FROM UserAccount")}
+            db.executemany(
+                """
+                INSERT INTO UserAccount (username, password, role, student_id)
+                VALUES (?, 'changeme', 'student', ?)
+                """,
+                [
+                    (_unique_username(t["email"], t["student_id"], taken), t["student_id"])
+                    for t in targets
+                    if not t["has_account"]
+                ],
+            )
+
+        db.execute(
+            "UPDATE Student SET status = ? WHERE student_id IN (SELECT value FROM json_each(?))",
+            (new_status, json.dumps([t["student_id"] for t in targets])),
+        )
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    return len(targets)
+
 @app.route("/admin/review_applications", methods=["GET", "POST"])
 @login_required(role="admin")
 def review_applications():
     db = get_db()
+    major = request.args.get("major") or None
 
     if request.method == "POST":
-        student_id = request.form.get("student_id")
         decision = request.form.get("decision")
+        major = request.form.get("major") or None
 
-        student = db.execute(
-            "SELECT * FROM Student WHERE student_id=?",
-            (student_id,),
-        ).fetchone()
-
-        if not student:
-            flash("Application not found.")
-            return redirect(url_for("review_applications"))
-
-        if decision == "accept":
-            db.execute(
-                "UPDATE Student SET status='Active' WHERE student_id=?",
-                (student_id,)
-            )
+        if request.form.get("accept_one"):
+            decision, student_ids = "accept", [request.form["accept_one"]]
+        elif request.form.get("deny_one"):
+            decision, student_ids = "deny", [request.form["deny_one"]]
+        elif request.form.get("student_id"):
+            student_ids = [request.form["student_id"]]
+        elif request.form.get("scope") == "all":
+            student_ids = None
+        else:
+            student_ids = request.form.getlist("student_ids")
 
-            # Auto-create user login account if none exists
-            username = student["email"].split("@")[0]
-            db.execute(
-                """
-                INSERT INTO UserAccount (username, password, role, student_id)
-                VALUES (?, 'changeme', 'student', ?)
-                """,
-                (username, student_id),
-            )
-            flash("Application approved & student activated.")
+        if student_ids is not None:
+            try:
+                student_ids = [int(sid) for sid in student_ids]
+            except ValueError:
+                flash("Invalid application id.")
+                return redirect(url_for("review_applications", major=major))
+
+        if decision not in ("accept", "deny"):
+            flash("Unknown decision.")
+        elif student_ids == []:
+            flash("No applications selected.")
+        else:
+            count = decide_applications(db, decision, student_ids, major)
+            invalidate_admin_aggregates()
+            if count == 0:
+                flash("Application not found.")
+            elif decision == "accept":
+                flash(f"Approved {count} application(s); student accounts created.")
+            else:
+                flash(f"Denied {count} application(s).")
+        return redirect(url_for("review_applications", major=major))
 
-        elif decision == "deny":
-            db.execute(
-                "UPDATE Student SET status='Denied' WHERE student_id=?",
-                (student_id,)
-            )
-            flash("Application denied.")
+    # Keyset pagination on (applied_on, student_id), backed by idx_student_status_applied
+    after = decode_cursor(request.args.get("after"), 2)
+    per_page = app.config["APPLICATIONS_PER_PAGE"]
 
-        db.commit()
-        return redirect(url_for("review_applications"))
+    where = ["status = 'Pending'"]
+    params = []
+    if major:
+        where.append("major = ?")
+        params.append(major)
+    if after:
+        where.append("(IFNULL(applied_on, ''), student_id) > (?, ?)")
+        params.extend(after)
 
     applications = db.execute(
-        "SELECT * FROM Student WHERE status='Pending' ORDER BY applied_on"
+        f"""
+        SELECT * FROM Student
+        WHERE {' AND '.join(where)}
+        ORDER BY IFNULL(applied_on, ''), student_id
+        LIMIT ?
+        """,
+        params + [per_page + 1],
     ).fetchall()
 
-    return render_template("review_applications.html", applications=applications)
+    next_cursor = None
+    if len(applications) > per_page:
+        applications = applications[:per_page]
+        last = applications[-1]
+        next_cursor = encode_cursor([last["applied_on"] or "", last["student_id"]])
+
+    departments = reference_data(db, "departments")
+
+    return render_template(
+        "review_applications.html",
+        applications=applications,
+        departments=departments,
+        major=major,
+        next_cursor=next_cursor,
+        paged=after is not None,
+    )
+
+# Admin: Search
+def fts_query(text):
+    """
+    Turn free text into an FTS5 query: every word must match as a prefix.
+    Only word characters survive, so user input can't inject FTS syntax.
+    """
+    return " ".join(f'"{word}"*' for word in re.findall(r"\w+", text))
+
+@app.route("/admin/search")
+@login_required(role="admin")
+def admin_search():
+    q = request.args.get("q", "").strip()
+    results = []
+    elapsed_ms = None
+
+    match = fts_query(q)
+    if match:
+        db = get_db()
+        started = time.perf_counter()
+        # Name matches weigh more than email/major/title matches
+        results = db.execute(
+            """
+            SELECT kind, ref_id, name, detail
+            FROM SearchIndex
+            WHERE SearchIndex MATCH ?
+            ORDER BY bm25(SearchIndex, 0.0, 0.0, 10.0, 1.0)
+            LIMIT ?
+            """,
+            (match, app.config["SEARCH_RESULT_LIMIT"]),
+        ).fetchall()
+        elapsed_ms = (time.perf_counter() - started) * 1000
+
+    return render_template(
+        "search.html",
+        q=q,
+        results=results,
+        elapsed_ms=elapsed_ms,
+    )
 
 # Admin: Students
+def encode_cursor(values):
+    """
+    Opaque, URL-safe token for a keyset position.
+    """
+    return base64.urlsafe_b64encode(json.dumps(values).encode("utf8")).decode("ascii").rstrip("=")
+
+def decode_cursor(token, size):
+    if not token:
+        return None
+    try:
+        values = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+    except ValueError:
+        return None
+    if not isinstance(values, list) or len(values) != size:
+        return None
+    # Values are bound straight into the keyset query, so only scalars will do
+    if any(isinstance(v, bool) or not isinstance(v, (str, int, float)) for v in values):
+        return None
+    return values
+
 @app.route("/admin/students")
 @login_required(role="admin")
 def admin_students():
     db = get_db()
     q = request.args.get("q", "").strip()
-    page = int(request.args.get("page", 1))
-    per_page = 10
+    after = decode_cursor(request.args.get("after"), 3)
+    before = decode_cursor(request.args.get("before"), 3)
+    per_page = app.config["STUDENTS_PER_PAGE"]
 
-    base_sql = "FROM Student WHERE 1=1"
+    # Keyset pagination on (last_name, first_name, student_id), backed by idx_student_name
+    where = ["1=1"]
     params = []
 
-    if q:
-        base_sql += " AND (first_name LIKE ? OR last_name LIKE ? OR email LIKE ?)"
-        like = f"%{q}%"
-        params.extend([like, like, like])
+    match = fts_query(q)
+    if match:
+        where.append(
+            "student_id IN (SELECT ref_id FROM SearchIndex "
+            "WHERE SearchIndex MATCH ? AND kind = 'student')"
+        )
+        params.append(match)
 
-    total = db.execute(f"SELECT COUNT(*) AS c {base_sql}", params).fetchone()["c"]
-    total_pages = max(1, math.ceil(total / per_page))
-    page = max(1, min(page, total_pages))
-    offset = (page - 1) * per_page
+    if before:
+        where.append("(last_name, first_name, student_id) < (?, ?, ?)")
+        params.extend(before)
+        order = "DESC"
+    else:
+        if after:
+            where.append("(last_name, first_name, student_id) > (?, ?, ?)")
+            params.extend(after)
+        order = "ASC"
 
+    # Fetch one extra row to learn whether another page exists
     students = db.execute(
-        f"SELECT * {base_sql} ORDER BY last_name, first_name LIMIT ? OFFSET ?",
-        params + [per_page, offset],
+        f"""
+        SELECT * FROM Student
+        WHERE {' AND '.join(where)}
+        ORDER BY last_name {order}, first_name {order}, student_id {order}
+        LIMIT ?
+        """,
+        params + [per_page + 1],
     ).fetchall()
 
+    has_more = len(students) > per_page
+    students = students[:per_page]
+    if before:
+        students.reverse()
+
+    def cursor_for(row):
+        return encode_cursor([row["last_name"], row["first_name"], row["student_id"]])
+
+    next_cursor = prev_cursor = None
+    if students:
+        if has_more or before:
+            next_cursor = cursor_for(students[-1])
+        if (has_more and before) or after:
+            prev_cursor = cursor_for(students[0])
+
+    # Exact totals are only kept for the unfiltered directory, cached until a student write
+    total = None
+    if not q:
+        total, _ = cached(
+            "student_total",
+            lambda: db.execute("SELECT COUNT(*) AS c FROM Student").fetchone()["c"],
+            ttl=app.config["DASHBOARD_CACHE_TTL"],
+        )
+
     return render_template(
         "students.html",
         students=students,
         q=q,
-        page=page,
-        total_pages=total_pages,
+        next_cursor=next_cursor,
+        prev_cursor=prev_cursor,
+        total=total,
     )
 
 @app.route("/admin/students/add", methods=["GET", "POST"])
@@ -344,6 +3055,7 @@ def admin_add_student():
             ),
         )
         db.commit()
+        invalidate_admin_aggregates()
         flash("Student added.")
         return redirect(url_for("admin_students"))
     return render_template("add_student.html")
@@ -372,6 +3084,7 @@ def admin_edit_student(student_id):
             ),
         )
         db.commit()
+        invalidate_admin_aggregates()
         flash("Student updated.")
         return redirect(url_for("admin_students"))
     return render_template("edit_student.html", student=student)
@@ -380,9 +3093,14 @@ def admin_edit_student(student_id):
 @login_required(role="admin")
 def admin_delete_student(student_id):
     db = get_db()
-    db.execute("DELETE FROM Student WHERE student_id=?", (student_id,))
-    db.commit()
-    flash("Student deleted.")
+    try:
+        db.execute("DELETE FROM Student WHERE student_id=?", (student_id,))
+        db.commit()
+        invalidate_admin_aggregates()
+        flash("Student deleted.")
+    except sqlite3.IntegrityError:
+        db.rollback()
+        flash("⚠ Student still has enrollments, attendance or a login account and cannot be deleted.")
     return redirect(url_for("admin_students"))
 
 # Admin: Instructors & Payroll
@@ -405,16 +3123,6 @@ def admin_instructors():
     ).fetchall()
     return render_template("instructors.html", instructors=instructors)
 
-def _get_rooms(db):
-    return db.execute(
-        """
-        SELECT r.room_id, r.room_number, b.building_name
-        FROM Room r
-        JOIN Building b ON r.building_id = b.building_id
-        ORDER BY b.building_name, r.room_number
-        """
-    ).fetchall()
-
 @app.route("/admin/payroll")
 @login_required(role="admin")
 def admin_payroll():
@@ -480,10 +3188,8 @@ def admin_add_payroll():
 @login_required(role="admin")
 def admin_add_instructor():
     db = get_db()
-    departments = db.execute(
-        "SELECT * FROM Department ORDER BY department_name"
-    ).fetchall()
-    rooms = _get_rooms(db)
+    departments = reference_data(db, "departments")
+    rooms = reference_data(db, "rooms")
 
     if request.method == "POST":
         office_id = request.form.get("office_id") or None
@@ -504,6 +3210,7 @@ def admin_add_instructor():
             ),
         )
         db.commit()
+        invalidate_admin_aggregates()
         flash("Instructor added.")
         return redirect(url_for("admin_instructors"))
 
@@ -520,10 +3227,8 @@ def admin_edit_instructor(employee_id):
     instructor = db.execute(
         "SELECT * FROM Employee WHERE employee_id=?", (employee_id,)
     ).fetchone()
-    departments = db.execute(
-        "SELECT * FROM Department ORDER BY department_name"
-    ).fetchall()
-    rooms = _get_rooms(db)
+    departments = reference_data(db, "departments")
+    rooms = reference_data(db, "rooms")
 
     if request.method == "POST":
         office_id = request.form.get("office_id") or None
@@ -560,9 +3265,14 @@ def admin_edit_instructor(employee_id):
 @login_required(role="admin")
 def admin_delete_instructor(employee_id):
     db = get_db()
-    db.execute("DELETE FROM Employee WHERE employee_id=?", (employee_id,))
-    db.commit()
-    flash("Instructor deleted.")
+    try:
+        db.execute("DELETE FROM Employee WHERE employee_id=?", (employee_id,))
+        db.commit()
+        invalidate_admin_aggregates()
+        flash("Instructor deleted.")
+    except sqlite3.IntegrityError:
+        db.rollback()
+        flash("⚠ Instructor still has sections, payroll, reviews or a login account and cannot be deleted.")
     return redirect(url_for("admin_instructors"))
 
 @app.route("/admin/instructors/<int:employee_id>/reviews")
@@ -638,9 +3348,7 @@ def admin_budgets():
 @login_required(role="admin")
 def admin_add_budget():
     db = get_db()
-    departments = db.execute(
-        "SELECT * FROM Department ORDER BY department_name"
-    ).fetchall()
+    departments = reference_data(db, "departments")
 
     if request.method == "POST":
         db.execute(
@@ -666,50 +3374,32 @@ def admin_add_budget():
 @login_required(role="admin")
 def admin_courses():
     db = get_db()
-    courses = db.execute(
-        """
-        SELECT c.*, d.department_name
-        FROM Course c
-        JOIN Department d ON c.department_id = d.department_id
-        ORDER BY c.course_code
-        """
-    ).fetchall()
-
-    sections_raw = db.execute(
-        """
-        SELECT cs.selection_id,
-               cs.course_id,
-               cs.capacity,
-               e.first_name || ' ' || e.last_name AS instructor_name,
-               b.building_name,
-               r.room_number
-        FROM CourseSelection cs
-        LEFT JOIN Employee e ON cs.instructor_id = e.employee_id
-        LEFT JOIN Room r ON cs.room_id = r.room_id
-        LEFT JOIN Building b ON r.building_id = b.building_id
-        ORDER BY cs.course_id, cs.selection_id
-        """
-    ).fetchall()
 
-    sections = attach_meeting_labels(db, sections_raw)
+    def load():
+        courses = db.execute(
+            """
+            SELECT c.*, d.department_name
+            FROM Course c
+            JOIN Department d ON c.department_id = d.department_id
+            ORDER BY c.course_code
+            """
+        ).fetchall()
 
-    section_map = {}
-    for s in sections:
-        section_map.setdefault(s["course_id"], []).append(s)
+        section_map = {}
+        for s in section_catalog(db):
+            section_map.setdefault(s["course_id"], []).append(s)
+        return {"courses": courses, "section_map": section_map}
 
-    return render_template(
-        "courses.html",
-        courses=courses,
-        section_map=section_map
+    course_table = render_fragment(
+        "admin_courses", "_course_table.html", load, catalog_version(db)
     )
+    return render_template("courses.html", course_table=course_table)
 
 @app.route("/admin/courses/add", methods=["GET", "POST"])
 @login_required(role="admin")
 def admin_add_course():
     db = get_db()
-    departments = db.execute(
-        "SELECT * FROM Department ORDER BY department_name"
-    ).fetchall()
+    departments = reference_data(db, "departments")
     if request.method == "POST":
         db.execute(
             """
@@ -724,6 +3414,7 @@ def admin_add_course():
             ),
         )
         db.commit()
+        invalidate_admin_aggregates()
         flash("Course added.")
         return redirect(url_for("admin_courses"))
     return render_template("add_course.html", departments=departments)
@@ -735,9 +3426,7 @@ def admin_edit_course(course_id):
     course = db.execute(
         "SELECT * FROM Course WHERE course_id=?", (course_id,)
     ).fetchone()
-    departments = db.execute(
-        "SELECT * FROM Department ORDER BY department_name"
-    ).fetchall()
+    departments = reference_data(db, "departments")
     if request.method == "POST":
         db.execute(
             """
@@ -762,9 +3451,14 @@ def admin_edit_course(course_id):
 @login_required(role="admin")
 def admin_delete_course(course_id):
     db = get_db()
-    db.execute("DELETE FROM Course WHERE course_id=?", (course_id,))
-    db.commit()
-    flash("Course deleted.")
+    try:
+        db.execute("DELETE FROM Course WHERE course_id=?", (course_id,))
+        db.commit()
+        invalidate_admin_aggregates()
+        flash("Course deleted.")
+    except sqlite3.IntegrityError:
+        db.rollback()
+        flash("⚠ Course still has sections or prerequisites and cannot be deleted.")
     return redirect(url_for("admin_courses"))
 
 @app.route("/admin/courses/<int:course_id>/sections")
@@ -781,7 +3475,7 @@ def admin_course_sections(course_id):
         SELECT cs.selection_id,
                cs.course_id,
                cs.capacity,
-               (SELECT COUNT(*) FROM Enrollment WHERE selection_id = cs.selection_id) AS enrolled,
+               cs.enrolled_count AS enrolled,
                e.first_name || ' ' || e.last_name AS instructor_name,
                b.building_name,
                r.room_number
@@ -812,11 +3506,9 @@ def admin_add_section(course_id):
         "SELECT * FROM Course WHERE course_id=?", (course_id,)
     ).fetchone()
 
-    instructors = db.execute(
-        "SELECT employee_id, first_name || ' ' || last_name AS name FROM Employee ORDER BY last_name"
-    ).fetchall()
+    instructors = reference_data(db, "instructors")
 
-    rooms = _get_rooms(db)
+    rooms = reference_data(db, "rooms")
 
     if request.method == "POST":
         instructor_id = request.form.get("instructor_id") or None
@@ -865,11 +3557,9 @@ def admin_edit_section(selection_id, course_id):
         (selection_id,),
     ).fetchone()
 
-    instructors = db.execute(
-        "SELECT employee_id, first_name || ' ' || last_name AS name FROM Employee ORDER BY last_name"
-    ).fetchall()
+    instructors = reference_data(db, "instructors")
 
-    rooms = _get_rooms(db)
+    rooms = reference_data(db, "rooms")
 
     # existing schedule rows for this section
     sched_rows = db.execute(
@@ -943,45 +3633,515 @@ def admin_edit_section(selection_id, course_id):
 @login_required(role="admin")
 def admin_delete_section(selection_id, course_id):
     db = get_db()
-    db.execute("DELETE FROM CourseSchedule WHERE selection_id=?", (selection_id,))
-    db.execute("DELETE FROM CourseSelection WHERE selection_id=?", (selection_id,))
-    db.commit()
-    flash("Section deleted.")
+    try:
+        db.execute("DELETE FROM CourseSchedule WHERE selection_id=?", (selection_id,))
+        db.execute("DELETE FROM CourseSelection WHERE selection_id=?", (selection_id,))
+        db.commit()
+        flash("Section deleted.")
+    except sqlite3.IntegrityError:
+        db.rollback()
+        flash("⚠ Section still has enrolled students or attendance and cannot be deleted.")
     return redirect(url_for("admin_course_sections", course_id=course_id))
 
+# Admin: Performance
+@app.route("/admin/perf", methods=["GET", "POST"])
+@login_required(role="admin")
+def admin_perf():
+    if request.method == "POST":
+        clear_profile_log()
+        flash("Profile data cleared.")
+        return redirect(url_for("admin_perf"))
+
+    return render_template(
+        "admin_perf.html",
+        enabled=app.config["SQL_PROFILING"],
+        history=app.config["SQL_PROFILE_HISTORY"],
+        summary=profile_summary(),
+        slow_ms=app.config["SLOW_QUERY_MS"],
+        slow_log=app.config["SLOW_QUERY_LOG"],
+        slow_queries=slow_query_summary(),
+    )
+
 # Admin: SQL Console
 @app.route("/admin/sql", methods=["GET", "POST"])
 @login_required(role="admin")
 def admin_sql_console():
-    db = get_db()
     results = None
     headers = None
+    plan = None
+    truncated = False
+    elapsed_ms = None
     query = ""
+    explain = False
 
     if request.method == "POST":
         query = request.form.get("query", "").strip()
+        explain = bool(request.form.get("explain"))
+        time_limit = app.config["SQL_CONSOLE_TIME_LIMIT"]
+        max_rows = app.config["SQL_CONSOLE_MAX_ROWS"]
 
-        forbidden = ["INSERT", "UPDATE", "DELETE", "DROP", "ALTER", "CREATE"]
-        q_upper = query.upper()
-
-        if any(bad in q_upper for bad in forbidden):
-            flash("Modification queries are not allowed for safety.")
-        elif not q_upper.startswith("SELECT"):
+        if not re.match(r"\s*(SELECT|WITH)\b", query, re.IGNORECASE):
             flash("Only SELECT queries are permitted.")
         else:
+            # Separate read-only connection: the app's own connection is never exposed
+            ro = open_readonly_connection()
             try:
-                cursor = db.execute(query)
-                rows = cursor.fetchall()
-                headers = [desc[0] for desc in cursor.description] if rows else []
-                results = rows
+                set_time_budget(ro, time_limit)
+                started = time.perf_counter()
+                if explain:
+                    plan = explain_plan(ro, query)
+                else:
+                    cursor = ro.execute(query)
+                    headers = [desc[0] for desc in cursor.description] if cursor.description else []
+                    results = []
+                    while len(results) < max_rows:
+                        batch = cursor.fetchmany(min(500, max_rows - len(results)))
+                        if not batch:
+                            break
+                        results.extend(batch)
+                    truncated = len(results) >= max_rows and cursor.fetchone() is not None
+                elapsed_ms = (time.perf_counter() - started) * 1000
+            except sqlite3.OperationalError as e:
+                results = None
+                if "interrupted" in str(e):
+                    flash(f"⚠ Query stopped after the {time_limit:g}s time limit.")
+                else:
+                    flash(f"SQL Error: {e}")
             except Exception as e:
+                results = None
                 flash(f"SQL Error: {e}")
+            finally:
+                ro.close()
 
     return render_template(
         "admin_sql.html",
         query=query,
         results=results,
         headers=headers,
+        plan=plan,
+        explain=explain,
+        truncated=truncated,
+        elapsed_ms=elapsed_ms,
+        max_rows=app.config["SQL_CONSOLE_MAX_ROWS"],
+    )
+
+# Admin: Exports
+EXPORT_FORMATS = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+}
+
+# Ordered by primary key so SQLite can stream them without a sort
+EXPORTS = {
+    "students": """
+        SELECT student_id, first_name, last_name, email, major, status, gpa, applied_on
+        FROM Student
+        ORDER BY student_id
+    """,
+    "payroll": """
+        SELECT p.payroll_id, p.employee_id,
+               e.first_name || ' ' || e.last_name AS name,
+               p.pay_date, p.gross_amount, p.deductions, p.net_amount, p.notes
+        FROM Payroll p
+        JOIN Employee e ON p.employee_id = e.employee_id
+        ORDER BY p.payroll_id
+    """,
+    "enrollments": """
+        SELECT en.enrollment_id, en.student_id, s.first_name, s.last_name,
+               en.selection_id, c.course_code, c.course_name,
+               en.enrollment_date, en.grade
+        FROM Enrollment en
+        JOIN Student s ON en.student_id = s.student_id
+        JOIN CourseSelection cs ON en.selection_id = cs.selection_id
+        JOIN Course c ON cs.course_id = c.course_id
+        ORDER BY en.enrollment_id
+    """,
+}
+
+def stream_query(sql, params=(), fmt="csv", filename="export", time_limit=None):
+    """
+    Run sql on a read-only connection and stream the rows as CSV or NDJSON.
+    The statement is executed up front so SQL errors surface before the response
+    starts; rows are then fetched in batches, so memory stays flat at any size.
+    """
+    db = open_readonly_connection()
+    try:
+        if time_limit:
+            set_time_budget(db, time_limit)
+        cursor = db.execute(sql, params)
+    except Exception:
+        db.close()
+        raise
+
+    headers = [desc[0] for desc in cursor.description or []]
+    batch_size = app.config["EXPORT_BATCH_SIZE"]
+
+    def generate():
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        try:
+            if fmt == "csv":
+                writer.writerow(headers)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                if fmt == "csv":
+                    writer.writerows(rows)
+                else:
+                    for row in rows:
+                        buf.write(json.dumps(dict(zip(headers, row)), default=str))
+                        buf.write("\n")
+                yield buf.getvalue()
+                buf.seek(0)
+                buf.truncate()
+            if buf.tell():
+                yield buf.getvalue()
+        finally:
+            db.close()
+
+    response = Response(
+        generate(),
+        mimetype=EXPORT_FORMATS[fmt],
+        headers={"Content-Disposition": f"attachment; filename={filename}.{fmt}"},
+    )
+    # A client that disconnects before the body starts never runs generate(),
+    # so its finally can't be relied on; closing twice is harmless
+    response.call_on_close(db.close)
+    return response
+
+@app.route("/admin/export/<name>.<fmt>")
+@login_required(role="admin")
+def admin_export(name, fmt):
+    if name not in EXPORTS or fmt not in EXPORT_FORMATS:
+        abort(404)
+    return stream_query(
+        EXPORTS[name],
+        fmt=fmt,
+        filename=f"{name}-{time.strftime('%Y-%m-%d')}",
+    )
+
+@app.route("/admin/sql/export", methods=["POST"])
+@login_required(role="admin")
+def admin_sql_export():
+    query = request.form.get("query", "").strip()
+    fmt = request.form.get("format", "csv")
+
+    if fmt not in EXPORT_FORMATS:
+        abort(400)
+    if not re.match(r"\s*(SELECT|WITH)\b", query, re.IGNORECASE):
+        flash("Only SELECT queries are permitted.")
+        return redirect(url_for("admin_sql_console"))
+
+    try:
+        return stream_query(
+            query,
+            fmt=fmt,
+            filename=f"query-{time.strftime('%Y-%m-%d')}",
+            time_limit=app.config["SQL_EXPORT_TIME_LIMIT"],
+        )
+    except sqlite3.Error as e:
+        flash(f"SQL Error: {e}")
+        return redirect(url_for("admin_sql_console"))
+
+# Admin: Bulk Import
+IMPORT_MAX_ERRORS_SHOWN = 200
+IMPORT_ENCODING_ERROR = "file is not UTF-8 text; save it as CSV UTF-8 and try again"
+TIME_PATTERN = re.compile(r"^(\d{1,2}):(\d{2})$")
+
+def _load_import_lookups(db):
+    """
+    In-memory maps used to resolve and validate every row without per-row queries.
+    """
+    return {
+        "departments": {
+            r["department_name"].lower(): r
+            for r in db.execute("SELECT department_id, department_name FROM Department")
+        },
+        "courses": {
+            r["course_code"].lower(): r["course_id"]
+            for r in db.execute("SELECT course_id, course_code FROM Course")
+        },
+        "instructors": {
+            r["email"].lower(): r["employee_id"]
+            for r in db.execute("SELECT employee_id, email FROM Employee WHERE email IS NOT NULL")
+        },
+        "rooms": {
+            (r["building_name"].lower(), r["room_number"].lower()): r["room_id"]
+            for r in db.execute(
+                """
+                SELECT r.room_id, r.room_number, b.building_name
+                FROM Room r
+                JOIN Building b ON r.building_id = b.building_id
+                """
+            )
+        },
+        "student_emails": {
+            r["email"].lower()
+            for r in db.execute("SELECT email FROM Student WHERE email IS NOT NULL")
+        },
+    }
+
+def _parse_time(value, field):
+    m = TIME_PATTERN.match(value)
+    if not m or int(m.group(1)) > 23 or int(m.group(2)) > 59:
+        raise ValueError(f"{field} must be HH:MM")
+    return f"{int(m.group(1)):02d}:{m.group(2)}"
+
+def _parse_int(value, field, default=None):
+    if not value:
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f"{field} must be a whole number") from None
+
+def _parse_student_row(row, lookups):
+    if not row["first_name"] or not row["last_name"]:
+        raise ValueError("first_name and last_name are required")
+
+    email = row["email"].lower() or None
+    if email:
+        if email in lookups["student_emails"]:
+            raise ValueError(f"email {email} already exists")
+        lookups["student_emails"].add(email)
+
+    major = None
+    if row.get("major"):
+        dept = lookups["departments"].get(row["major"].lower())
+        if not dept:
+            raise ValueError(f"unknown major/department '{row['major']}'")
+        major = dept["department_name"]
+
+    return (row["first_name"], row["last_name"], email, major, row.get("status") or "Active")
+
+def _parse_course_row(row, lookups):
+    code = row["course_code"]
+    if not code or not row["course_name"]:
+        raise ValueError("course_code and course_name are required")
+    if code.lower() in lookups["courses"]:
+        raise ValueError(f"course {code} already exists")
+
+    dept = lookups["departments"].get(row["department"].lower())
+    if not dept:
+        raise ValueError(f"unknown department '{row['department']}'")
+
+    # Reserve the code so later rows in the same file can't repeat it
+    lookups["courses"][code.lower()] = None
+    return (code, row["course_name"], _parse_int(row.get("credit"), "credit"), dept["department_id"])
+
+def _parse_section_row(row, lookups):
+    course_id = lookups["courses"].get(row["course_code"].lower())
+    if not course_id:
+        raise ValueError(f"unknown course '{row['course_code']}'")
+
+    instructor_id = None
+    if row.get("instructor_email"):
+        instructor_id = lookups["instructors"].get(row["instructor_email"].lower())
+        if not instructor_id:
+            raise ValueError(f"unknown instructor '{row['instructor_email']}'")
+
+    room_id = None
+    if row.get("building") or row.get("room_number"):
+        room_id = lookups["rooms"].get((row.get("building", "").lower(), row.get("room_number", "").lower()))
+        if not room_id:
+            raise ValueError(f"unknown room '{row.get('building')} {row.get('room_number')}'")
+
+    days = re.findall(r"Th|[MTWF]", row["days"])
+    if not days or "".join(days) != row["days"]:
+        raise ValueError("days must be a combination of M, T, W, Th, F (e.g. MW or TTh)")
+
+    start = _parse_time(row["start_time"], "start_time")
+    end = _parse_time(row["end_time"], "end_time")
+    if _time_to_minutes(end) <= _time_to_minutes(start):
+        raise ValueError("end_time must be after start_time")
+
+    capacity = _parse_int(row.get("capacity"), "capacity", default=30)
+    return (course_id, instructor_id, room_id, capacity, days, start, end)
+
+def _insert_students(db, rows):
+    db.executemany(
+        """
+        INSERT INTO Student (first_name, last_name, email, major, status)
+        VALUES (?, ?, ?, ?, ?)
+        """,
+        rows,
+    )
+
+def _insert_courses(db, rows):
+    db.executemany(
+        """
+        INSERT INTO Course (course_code, course_name, credit, department_id)
+        VALUES (?, ?, ?, ?)
+        """,
+        rows,
+    )
+
+def _insert_sections(db, rows):
+    # Ids are assigned up front (we hold the write lock) so schedule rows
+    # can be inserted with executemany too
+    next_id = db.execute(
+        """
+        SELECT MAX(
+            COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'CourseSelection'), 0),
+            COALESCE((SELECT MAX(selection_id) FROM CourseSelection), 0)
+        ) + 1 AS n
+        """
+    ).fetchone()["n"]
+
+    sections = []
+    meetings = []
+    for offset, (course_id, instructor_id, room_id, capacity, days, start, end) in enumerate(rows):
+        selection_id = next_id + offset
+        sections.append((selection_id, course_id, instructor_id, room_id, capacity))
+        meetings.extend((selection_id, day, start, end) for day in days)
+
+    db.executemany(
+        """
+        INSERT INTO CourseSelection (selection_id, course_id, instructor_id, room_id, capacity)
+        VALUES (?, ?, ?, ?, ?)
+        """,
+        sections,
+    )
+    db.executemany(
+        """
+        INSERT INTO CourseSchedule (selection_id, day_code, start_time, end_time)
+        VALUES (?, ?, ?, ?)
+        """,
+        meetings,
+    )
+
+# kind -> (required columns, row parser, chunk writer)
+IMPORT_KINDS = {
+    "students": (["first_name", "last_name", "email"], _parse_student_row, _insert_students),
+    "courses": (["course_code", "course_name", "department"], _parse_course_row, _insert_courses),
+    "sections": (["course_code", "days", "start_time", "end_time"], _parse_section_row, _insert_sections),
+}
+
+def _import_error(report, line, message):
+    report["error_count"] += 1
+    if len(report["errors"]) < IMPORT_MAX_ERRORS_SHOWN:
+        report["errors"].append((line, message))
+
+def _flush_import_chunk(db, write, chunk, report):
+    try:
+        db.execute("BEGIN IMMEDIATE")
+        write(db, [values for _, values in chunk])
+        db.commit()
+        report["inserted"] += len(chunk)
+        return
+    except sqlite3.Error:
+        db.rollback()
+
+    # Something in the chunk was rejected by the database: redo it row by row
+    # so only the offending rows are reported and the rest still go in
+    for line, values in chunk:
+        try:
+            db.execute("BEGIN IMMEDIATE")
+            write(db, [values])
+            db.commit()
+            report["inserted"] += 1
+        except sqlite3.Error as e:
+            db.rollback()
+            _import_error(report, line, str(e))
+
+def import_csv(db, kind, stream):
+    """
+    Validate and load a CSV in a single streaming pass. Rows are resolved against
+    in-memory lookup maps, written with executemany in chunked transactions, and
+    bad rows are reported by line number without aborting the batch.
+    """
+    required, parse, write = IMPORT_KINDS[kind]
+    report = {"kind": kind, "inserted": 0, "error_count": 0, "errors": []}
+    started = time.perf_counter()
+
+    reader = csv.DictReader(stream)
+    try:
+        fields = [(f or "").strip().lower() for f in reader.fieldnames or []]
+    except UnicodeDecodeError:
+        fields = None
+
+    problem = None
+    if fields is None:
+        problem = IMPORT_ENCODING_ERROR
+    elif missing := [c for c in required if c not in fields]:
+        problem = f"missing columns: {', '.join(missing)}"
+    # DictReader keeps one value per header name, which would shift the others
+    elif duplicates := sorted({f or "(blank)" for f in fields if fields.count(f) > 1}):
+        problem = f"duplicate columns: {', '.join(duplicates)}"
+    if problem:
+        _import_error(report, 1, problem)
+        report["elapsed"] = 0.0
+        report["rows_per_sec"] = 0.0
+        return report
+
+    lookups = _load_import_lookups(db)
+    chunk_size = app.config["IMPORT_CHUNK_SIZE"]
+    chunk = []
+
+    try:
+        for raw in reader:
+            row = {f: (v or "").strip() for f, v in zip(fields, raw.values())}
+            try:
+                chunk.append((reader.line_num, parse(row, lookups)))
+            except ValueError as e:
+                _import_error(report, reader.line_num, str(e))
+
+            if len(chunk) >= chunk_size:
+                _flush_import_chunk(db, write, chunk, report)
+                chunk = []
+    except UnicodeDecodeError:
+        # Rows read before the bad bytes are still loaded
+        _import_error(report, reader.line_num + 1, IMPORT_ENCODING_ERROR)
+
+    if chunk:
+        _flush_import_chunk(db, write, chunk, report)
+
+    report["elapsed"] = time.perf_counter() - started
+    report["rows_per_sec"] = report["inserted"] / report["elapsed"] if report["elapsed"] else 0.0
+    return report
+
+@app.route("/admin/import", methods=["GET", "POST"])
+@login_required(role="admin")
+def admin_import():
+    report = None
+
+    if request.method == "POST":
+        kind = request.form.get("kind")
+        upload = request.files.get("file")
+        if kind not in IMPORT_KINDS:
+            flash("Choose what to import.")
+        elif not upload or not upload.filename:
+            flash("Choose a CSV file to upload.")
+        else:
+            stream = io.TextIOWrapper(upload.stream, encoding="utf-8-sig", newline="")
+            report = import_csv(get_db(), kind, stream)
+            invalidate_admin_aggregates()
+
+    return render_template(
+        "import.html",
+        kinds=IMPORT_KINDS,
+        report=report,
+    )
+
+@app.cli.command("import-csv")
+@click.argument("kind", type=click.Choice(sorted(IMPORT_KINDS)))
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+def import_csv_command(kind, path):
+    """Bulk-load students, courses or sections from a CSV file."""
+    db = open_connection()
+    try:
+        migrate_db(db)
+        with open(path, encoding="utf-8-sig", newline="") as f:
+            report = import_csv(db, kind, f)
+    finally:
+        db.close()
+
+    for line, message in report["errors"]:
+        click.echo(f"line {line}: {message}", err=True)
+    click.echo(
+        f"Imported {report['inserted']} {kind} with {report['error_count']} error(s) "
+        f"in {report['elapsed']:.2f}s ({report['rows_per_sec']:.0f} rows/s)."
     )
 
 # STUDENT
@@ -1020,13 +4180,20 @@ def student_dashboard():
         "student_dashboard.html",
         student=student,
         enrollments=enrollments,
+        transcript=get_transcript(db, sid),
     )
 
 @app.route("/student/courses")
 @login_required(role="student")
 def student_courses():
     db = get_db()
-    sid = session["student_id"]
+    courses = student_schedule(db, session["student_id"])
+    return render_template("student_courses.html", courses=courses)
+
+def student_schedule(db, sid):
+    """
+    The student's enrollments with course, room and meeting label.
+    """
     rows_raw = db.execute(
         """
         SELECT e.enrollment_id,
@@ -1046,9 +4213,7 @@ def student_courses():
         """,
         (sid,),
     ).fetchall()
-
-    courses = attach_meeting_labels(db, rows_raw)
-    return render_template("student_courses.html", courses=courses)
+    return attach_meeting_labels(db, rows_raw)
 
 @app.route("/student/enroll", methods=["GET", "POST"])
 @login_required(role="student")
@@ -1059,103 +4224,49 @@ def student_enroll():
     if request.method == "POST":
         selection_id = int(request.form["selection_id"])
 
-        # Capacity check
-        cap_row = db.execute(
-            """
-            SELECT capacity,
-                   (SELECT COUNT(*) FROM Enrollment WHERE selection_id = ?) AS enrolled
-            FROM CourseSelection
-            WHERE selection_id = ?
-            """,
-            (selection_id, selection_id),
-        ).fetchone()
-
-        if cap_row and cap_row["enrolled"] >= cap_row["capacity"]:
-            flash("⚠ This section is FULL. Please choose another.")
+        result = enroll_student(db, sid, selection_id)
+        if result != "enrolled":
+            flash(ENROLL_MESSAGES[result])
             return redirect(url_for("student_enroll"))
+        invalidate_admin_aggregates()
 
-        # Prerequisite check
-        course_row = db.execute(
-            "SELECT course_id FROM CourseSelection WHERE selection_id=?",
-            (selection_id,),
-        ).fetchone()
-        course_id = course_row["course_id"]
-
-        prereqs = db.execute(
-            "SELECT prereq_course_id FROM CoursePrerequisite WHERE course_id=?",
-            (course_id,),
-        ).fetchall()
-
-        for p in prereqs:
-            needed_id = p["prereq_course_id"]
-            passed = db.execute(
-                """
-                SELECT COUNT(*) AS c
-                FROM Enrollment e
-                JOIN CourseSelection cs ON e.selection_id = cs.selection_id
-                WHERE e.student_id = ?
-                  AND cs.course_id = ?
-                  AND e.grade IS NOT NULL
-                  AND e.grade >= 70
-                """,
-                (sid, needed_id),
-            ).fetchone()["c"]
-            if passed == 0:
-                flash("⚠ Prerequisite not met for this course.")
-                return redirect(url_for("student_enroll"))
-
-        # Time conflict check using CourseSchedule
-        existing = db.execute(
-            """
-            SELECT cs.selection_id
-            FROM Enrollment e
-            JOIN CourseSelection cs ON e.selection_id = cs.selection_id
-            WHERE e.student_id = ?
-            """,
-            (sid,),
-        ).fetchall()
-
-        for row in existing:
-            if sections_conflict(db, selection_id, row["selection_id"]):
-                flash("⚠ Schedule conflict with an existing class.")
-                return redirect(url_for("student_enroll"))
-
-        db.execute(
-            """
-            INSERT INTO Enrollment (student_id, selection_id, enrollment_date)
-            VALUES (?, ?, DATE('now'))
-            """,
-            (sid, selection_id),
-        )
-        db.commit()
         flash("Enrolled successfully.")
         return redirect(url_for("student_courses"))
 
-    # GET – available sections
-    selections_raw = db.execute(
-        """
-        SELECT cs.selection_id,
-               c.course_code,
-               c.course_name,
-               b.building_name,
-               r.room_number,
-               cs.capacity,
-               (SELECT COUNT(*) FROM Enrollment e WHERE e.selection_id = cs.selection_id) AS enrolled
-        FROM CourseSelection cs
-        JOIN Course c ON cs.course_id = c.course_id
-        LEFT JOIN Room r ON cs.room_id = r.room_id
-        LEFT JOIN Building b ON r.building_id = b.building_id
-        WHERE cs.selection_id NOT IN (
-            SELECT selection_id FROM Enrollment WHERE student_id = ?
-        )
-        ORDER BY c.course_code
-        """,
-        (sid,),
-    ).fetchall()
-
-    selections = attach_meeting_labels(db, selections_raw)
+    # GET – available sections, annotated with eligibility up front.
+    # Everything but the seat counts comes from the cached section catalog.
+    eligible_only = request.args.get("eligible") == "1"
+    catalog = section_catalog(db)
+    seats = dict(db.execute("SELECT selection_id, enrolled_count FROM CourseSelection").fetchall())
+    taken = {
+        row["selection_id"]
+        for row in db.execute("SELECT selection_id FROM Enrollment WHERE student_id = ?", (sid,))
+    }
+
+    # The catalog already carries every meeting mask; seed the per-request
+    # cache so the eligibility checks never go back to CourseSchedule
+    g.setdefault("section_masks", {}).update((s["selection_id"], s["mask"]) for s in catalog)
+
+    selections = annotate_eligibility(
+        db,
+        sid,
+        (
+            dict(s, enrolled=seats.get(s["selection_id"], 0))
+            for s in catalog
+            if s["selection_id"] not in taken
+        ),
+    )
+    hidden = 0
+    if eligible_only:
+        hidden = sum(1 for s in selections if not s["eligible"])
+        selections = [s for s in selections if s["eligible"]]
 
-    return render_template("student_enroll.html", selections=selections)
+    return render_template(
+        "student_enroll.html",
+        selections=selections,
+        eligible_only=eligible_only,
+        hidden=hidden,
+    )
 
 @app.route("/student/transcript")
 @login_required(role="student")
@@ -1168,34 +4279,15 @@ def student_transcript():
         (sid,),
     ).fetchone()
 
-    rows = db.execute(
-        """
-        SELECT c.course_code,
-               c.course_name,
-               c.credit,
-               e.grade
-        FROM Enrollment e
-        JOIN CourseSelection cs ON e.selection_id = cs.selection_id
-        JOIN Course c ON cs.course_id = c.course_id
-        WHERE e.student_id = ?
-        ORDER BY c.course_code
-        """,
-        (sid,),
-    ).fetchall()
-
-    total_credits = sum(r["credit"] for r in rows if r["credit"] is not None)
-    completed_rows = [r for r in rows if r["grade"] is not None]
-    if completed_rows:
-        gpa = sum((r["grade"] / 25.0) for r in completed_rows) / len(completed_rows)
-    else:
-        gpa = None
+    transcript = get_transcript(db, sid)
 
     return render_template(
         "transcript.html",
         student=student,
-        rows=rows,
-        total_credits=total_credits,
-        gpa=gpa,
+        rows=transcript["rows"],
+        terms=transcript["terms"],
+        total_credits=transcript["total_credits"],
+        gpa=transcript["gpa"],
     )
 
 # INSTRUCTOR
@@ -1218,13 +4310,27 @@ def instructor_dashboard():
         (eid,),
     ).fetchone()
 
+    sections = instructor_sections(db, eid)
+
+    return render_template(
+        "instructor_dashboard.html",
+        instructor=instructor,
+        sections=sections,
+    )
+
+def instructor_sections(db, eid):
+    """
+    Sections taught by the instructor, with room, seats and meeting label.
+    """
     sections_raw = db.execute(
         """
         SELECT cs.selection_id,
                c.course_code,
                c.course_name,
                b.building_name,
-               r.room_number
+               r.room_number,
+               cs.capacity,
+               cs.enrolled_count AS enrolled
         FROM CourseSelection cs
         JOIN Course c ON cs.course_id = c.course_id
         LEFT JOIN Room r ON cs.room_id = r.room_id
@@ -1234,14 +4340,7 @@ def instructor_dashboard():
         """,
         (eid,),
     ).fetchall()
-
-    sections = attach_meeting_labels(db, sections_raw)
-
-    return render_template(
-        "instructor_dashboard.html",
-        instructor=instructor,
-        sections=sections,
-    )
+    return attach_meeting_labels(db, sections_raw)
 
 @app.route("/instructor/reviews")
 @login_required(role="instructor")
@@ -1288,33 +4387,20 @@ def instructor_section(selection_id):
     db = get_db()
 
     if request.method == "POST":
+        grades = []
         for key, value in request.form.items():
             if key.startswith("grade_") and value.strip():
-                enrollment_id = key.split("_")[1]
-                db.execute(
-                    "UPDATE Enrollment SET grade=? WHERE enrollment_id=?",
-                    (float(value), enrollment_id),
-                )
+                grade = float(value)
+                grades.append((grade, key.split("_")[1], selection_id, grade))
 
-        sids = db.execute(
-            "SELECT DISTINCT student_id FROM Enrollment WHERE selection_id=?",
-            (selection_id,),
-        ).fetchall()
-        for row in sids:
-            sid = row["student_id"]
-            gpa_row = db.execute(
-                """
-                SELECT AVG(grade)/25.0 AS gpa
-                FROM Enrollment
-                WHERE student_id=? AND grade IS NOT NULL
-                """,
-                (sid,),
-            ).fetchone()
-            if gpa_row["gpa"] is not None:
-                db.execute(
-                    "UPDATE Student SET gpa=? WHERE student_id=?",
-                    (gpa_row["gpa"], sid),
-                )
+        # Student.gpa follows incrementally via the Enrollment grade triggers
+        db.executemany(
+            """
+            UPDATE Enrollment SET grade=?
+            WHERE enrollment_id=? AND selection_id=? AND grade IS NOT ?
+            """,
+            grades,
+        )
         db.commit()
         flash("Grades updated and GPA recalculated.")
 
@@ -1379,20 +4465,22 @@ def instructor_attendance(selection_id):
     today = db.execute("SELECT DATE('now') AS d").fetchone()["d"]
 
     if request.method == "POST":
-        db.execute(
-            "DELETE FROM Attendance WHERE selection_id=? AND date=?",
-            (selection_id, today),
+        records = [
+            (key.split("_")[1], selection_id, today, value)
+            for key, value in request.form.items()
+            if key.startswith("status_")
+        ]
+        # AttendanceRollup follows via the Attendance triggers
+        db.executemany(
+            """
+            INSERT INTO Attendance (student_id, selection_id, date, status)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT (student_id, selection_id, date)
+            DO UPDATE SET status = excluded.status
+            WHERE status IS NOT excluded.status
+            """,
+            records,
         )
-        for key, value in request.form.items():
-            if key.startswith("status_"):
-                sid = key.split("_")[1]
-                db.execute(
-                    """
-                    INSERT INTO Attendance (student_id, selection_id, date, status)
-                    VALUES (?, ?, ?, ?)
-                    """,
-                    (sid, selection_id, today, value),
-                )
         db.commit()
         flash("Attendance saved.")
 
@@ -1443,10 +4531,10 @@ def instructor_attendance(selection_id):
     stats = db.execute(
         """
         SELECT
-            SUM(status='Present') AS present_count,
-            SUM(status='Absent')  AS absent_count,
-            SUM(status='Late')    AS late_count
-        FROM Attendance
+            SUM(present_count) AS present_count,
+            SUM(absent_count)  AS absent_count,
+            SUM(late_count)    AS late_count
+        FROM AttendanceRollup
         WHERE selection_id=?
         """,
         (selection_id,),
@@ -1461,6 +4549,120 @@ def instructor_attendance(selection_id):
         stats=stats,
     )
 
+# JSON API
+# Read-only JSON for the student portal and kiosks. Each resource lists the
+# tables it is built from and its ETag is a hash of their TableVersion
+# counters, so a poll whose If-None-Match still matches gets a 304 after one
+# primary-key lookup, without running the query behind it.
+API_PREFIX = "/api/v1"
+SECTION_TABLES = CATALOG_TABLES + ("Enrollment",)
+
+def api_login_required(role=None):
+    """
+    login_required for JSON clients: 401/403 instead of a redirect to the login page.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapped_view(**kwargs):
+            if "user_id" not in session:
+                abort(401)
+            if role and session.get("role") != role:
+                abort(403)
+            return view(**kwargs)
+
+        return wrapped_view
+
+    return decorator
+
+def conditional_json(tables, load, scope=()):
+    """
+    JSON response for load(db) carrying a strong ETag built from the request
+    path, scope (whatever else the body depends on) and the counters of tables.
+    Answers 304 Not Modified without calling load when the client's copy is current.
+    """
+    db = get_db()
+    etag = hashlib.sha1(
+        json.dumps([request.path, list(scope), table_versions(db, *tables)]).encode()
+    ).hexdigest()
+
+    # If-None-Match uses the weak comparison (RFC 9110 13.1.2), so a tag a
+    # proxy has weakened to W/"..." still matches
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+    else:
+        response = app.json.response(load(db))
+    response.set_etag(etag)
+    # Clients may keep a copy but have to revalidate it on every use
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response
+
+@app.route(f"{API_PREFIX}/courses")
+@api_login_required()
+def api_courses():
+    def load(db):
+        rows = db.execute(
+            """
+            SELECT c.course_id, c.course_code, c.course_name, c.credit,
+                   c.department_id, d.department_name
+            FROM Course c
+            JOIN Department d ON c.department_id = d.department_id
+            ORDER BY c.course_code
+            """
+        ).fetchall()
+        return {"courses": [dict(row) for row in rows]}
+
+    return conditional_json(("Course", "Department"), load)
+
+@app.route(f"{API_PREFIX}/sections")
+@api_login_required()
+def api_sections():
+    course_id = request.args.get("course_id", type=int)
+
+    def load(db):
+        seats = dict(db.execute("SELECT selection_id, enrolled_count FROM CourseSelection").fetchall())
+        sections = []
+        for s in section_catalog(db):
+            if course_id is not None and s["course_id"] != course_id:
+                continue
+            section = {k: v for k, v in s.items() if k != "mask"}
+            section["enrolled"] = seats.get(s["selection_id"], 0)
+            section["seats_left"] = max(s["capacity"] - section["enrolled"], 0)
+            sections.append(section)
+        return {"sections": sections}
+
+    return conditional_json(SECTION_TABLES, load, scope=(course_id,))
+
+@app.route(f"{API_PREFIX}/student/schedule")
+@api_login_required(role="student")
+def api_student_schedule():
+    sid = session["student_id"]
+    return conditional_json(
+        SECTION_TABLES,
+        lambda db: {"student_id": sid, "courses": student_schedule(db, sid)},
+        scope=(sid,),
+    )
+
+@app.route(f"{API_PREFIX}/instructor/sections")
+@api_login_required(role="instructor")
+def api_instructor_sections():
+    eid = session["employee_id"]
+    return conditional_json(
+        SECTION_TABLES,
+        lambda db: {"employee_id": eid, "sections": instructor_sections(db, eid)},
+        scope=(eid,),
+    )
+
+# TEMPLATE WARM-UP
+def warm_templates():
+    """
+    Compile every template up front (from the bytecode cache when it is warm)
+    so the first request to each page doesn't pay for it.
+    """
+    for name in app.jinja_env.list_templates():
+        app.jinja_env.get_template(name)
+
+warm_templates()
+
 # RUN
 if __name__ == "__main__":
     print(app.url_map)
@@ -0,0 +1,49 @@
+import os
+import sys
+
+import pytest
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+import app as college  # noqa: E402
+
+
+@pytest.fixture
+def db_path(tmp_path, monkeypatch):
+    """A fresh database.db built from schema.sql plus every migration."""
+    monkeypatch.chdir(APP_DIR)
+    path = str(tmp_path / "database.db")
+    db = college.open_connection(path)
+    try:
+        college.init_db(db)
+    finally:
+        db.close()
+    monkeypatch.setattr(college, "DATABASE", path)
+    # Cache entries are keyed on change counters, which restart for every database
+    college.invalidate_cache(*college.cache_stats())
+    return path
+
+
+@pytest.fixture
+def db(db_path):
+    conn = college.open_connection(db_path)
+    yield conn
+    conn.close()
+
+
+@pytest.fixture
+def client(db_path):
+    college.app.config["TESTING"] = True
+    return college.app.test_client()
+
+
+@pytest.fixture
+def login(client):
+    def login(username):
+        client.get("/logout")
+        response = client.post("/login", data={"username": username, "password": "password"})
+        assert response.status_code == 302
+        return client
+
+    return login
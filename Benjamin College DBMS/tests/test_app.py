@@ -0,0 +1,261 @@
+import base64
+import io
+import json
+import sqlite3
+import threading
+
+import pytest
+
+import app as college
+
+
+def cursor_token(values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip("=")
+
+
+# Migrations
+
+def test_fresh_database_is_fully_migrated(db):
+    latest = college.MIGRATIONS[-1]["version"]
+    assert college.get_schema_version(db) == latest
+    assert [r["version"] for r in db.execute("SELECT version FROM schema_version ORDER BY version")] == [
+        m["version"] for m in college.MIGRATIONS
+    ]
+    assert college.migrate_db(db) == []
+
+
+def test_concurrent_migrators_apply_each_migration_once(tmp_path):
+    path = str(tmp_path / "baseline.db")
+    baseline = college.open_connection(path)
+    with college.app.open_resource(college.SCHEMA_FILE) as f:
+        baseline.executescript(f.read().decode("utf8"))
+    baseline.close()
+
+    errors = []
+
+    def migrate():
+        conn = college.open_connection(path)
+        try:
+            college.migrate_db(conn)
+        except Exception as e:
+            errors.append(e)
+        finally:
+            conn.close()
+
+    threads = [threading.Thread(target=migrate) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert errors == []
+    conn = college.open_connection(path)
+    assert college.get_schema_version(conn) == college.MIGRATIONS[-1]["version"]
+    assert conn.execute("SELECT COUNT(*) FROM schema_version").fetchone()[0] == len(college.MIGRATIONS)
+    conn.close()
+
+
+# Enrollment
+
+def one_seat_left(db, selection_id):
+    db.execute(
+        "UPDATE CourseSelection SET capacity = enrolled_count + 1 WHERE selection_id = ?",
+        (selection_id,),
+    )
+    db.commit()
+
+
+def test_enroll_refuses_the_seat_past_capacity(db):
+    one_seat_left(db, 5)
+    with college.app.app_context():
+        assert college.enroll_student(db, 1, 5) == "enrolled"
+        assert college.enroll_student(db, 2, 5) == "full"
+    row = db.execute("SELECT capacity, enrolled_count FROM CourseSelection WHERE selection_id = 5").fetchone()
+    assert row["enrolled_count"] == row["capacity"]
+
+
+def test_concurrent_enrollments_never_oversubscribe(db_path, db):
+    one_seat_left(db, 5)
+    results = []
+
+    def enroll(student_id):
+        conn = college.open_connection(db_path)
+        try:
+            with college.app.app_context():
+                results.append(college.enroll_student(conn, student_id, 5))
+        finally:
+            conn.close()
+
+    threads = [threading.Thread(target=enroll, args=(sid,)) for sid in (1, 2, 3, 5)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert sorted(results) == ["enrolled", "full", "full", "full"]
+    count = db.execute("SELECT COUNT(*) FROM Enrollment WHERE selection_id = 5").fetchone()[0]
+    capacity = db.execute("SELECT capacity FROM CourseSelection WHERE selection_id = 5").fetchone()[0]
+    assert count == capacity
+
+
+# Keyset cursors
+
+def test_cursor_round_trip():
+    token = college.encode_cursor(["Smith", "Jane", 7])
+    assert college.decode_cursor(token, 3) == ["Smith", "Jane", 7]
+
+
+def test_decode_cursor_rejects_malformed_tokens():
+    assert college.decode_cursor(None, 2) is None
+    assert college.decode_cursor("not base64!", 2) is None
+    assert college.decode_cursor(cursor_token([1, 2, 3]), 2) is None
+    assert college.decode_cursor(cursor_token({"a": 1}), 1) is None
+
+
+def test_decode_cursor_rejects_non_scalar_values():
+    assert college.decode_cursor(cursor_token([{"a": 1}, 2, 3]), 3) is None
+    assert college.decode_cursor(cursor_token([[1], 2]), 2) is None
+    assert college.decode_cursor(cursor_token([True, 2]), 2) is None
+    assert college.decode_cursor(cursor_token([None, 2]), 2) is None
+    assert college.decode_cursor(cursor_token(["2024-01-01", 2.5]), 2) == ["2024-01-01", 2.5]
+
+
+def test_forged_cursor_falls_back_to_first_page(login):
+    client = login("admin")
+    assert client.get("/admin/students?after=" + cursor_token([{"a": 1}, 2, 3])).status_code == 200
+    assert client.get("/admin/review_applications?after=" + cursor_token([[1], 2])).status_code == 200
+
+
+# Grade totals
+
+def student_totals(db, student_id):
+    return tuple(db.execute(
+        "SELECT grade_points, graded_credits, gpa FROM Student WHERE student_id = ?",
+        (student_id,),
+    ).fetchone())
+
+
+def test_grade_triggers_keep_totals_in_step(db):
+    db.execute("INSERT INTO Enrollment (student_id, selection_id) VALUES (2, 3)")
+    db.execute("UPDATE Enrollment SET grade = 80 WHERE student_id = 2 AND selection_id = 3")
+    db.execute("UPDATE Enrollment SET grade = NULL WHERE student_id = 1 AND selection_id = 3")
+    db.execute("DELETE FROM Enrollment WHERE student_id = 3")
+    db.commit()
+    assert college.reconcile_grade_totals(db) == 0
+
+
+def test_ungraded_enrollment_leaves_totals_alone(db):
+    before = student_totals(db, 2)
+    db.execute("INSERT INTO Enrollment (student_id, selection_id) VALUES (2, 3)")
+    db.commit()
+    assert student_totals(db, 2) == before
+
+
+def test_course_rename_only_drops_transcript_summaries(db):
+    college.get_transcript(db, 1)
+    db.execute("UPDATE Student SET grade_points = 1 WHERE student_id = 1")
+    db.execute("UPDATE Course SET course_name = 'Renamed' WHERE course_id = 1")
+    db.commit()
+    # A recompute would have overwritten the marker value
+    assert student_totals(db, 1)[0] == 1
+    assert db.execute("SELECT COUNT(*) FROM TranscriptSummary WHERE student_id = 1").fetchone()[0] == 0
+
+    db.execute("UPDATE Course SET credit = credit + 1 WHERE course_id = 1")
+    db.commit()
+    assert student_totals(db, 1)[0] != 1
+    assert college.reconcile_grade_totals(db) == 0
+
+
+# Exports
+
+def test_export_connection_closed_when_body_never_read(db_path, monkeypatch):
+    opened = []
+
+    def open_readonly(path=None):
+        conn = college.sqlite3.connect(path or college.DATABASE)
+        opened.append(conn)
+        return conn
+
+    monkeypatch.setattr(college, "open_readonly_connection", open_readonly)
+    with college.app.test_request_context():
+        response = college.stream_query("SELECT * FROM Student")
+    response.close()
+
+    with pytest.raises(sqlite3.ProgrammingError):
+        opened[0].execute("SELECT 1")
+
+
+# Bulk import
+
+def upload(login, body, kind="students"):
+    client = login("admin")
+    response = client.post(
+        "/admin/import",
+        data={"kind": kind, "file": (io.BytesIO(body), "upload.csv")},
+        content_type="multipart/form-data",
+    )
+    assert response.status_code == 200
+    return response.get_data(as_text=True)
+
+
+def import_text(db, text, kind="students"):
+    return college.import_csv(db, kind, io.StringIO(text, newline=""))
+
+
+def test_import_loads_valid_rows_and_reports_bad_ones(db):
+    report = import_text(db, "first_name,last_name,email\nAda,Lovelace,ada@example.edu\n,Nobody,\n")
+    assert report["inserted"] == 1
+    assert report["errors"] == [(3, "first_name and last_name are required")]
+
+
+def test_import_rejects_missing_columns(db):
+    report = import_text(db, "first_name,email\nAda,ada@example.edu\n")
+    assert report["inserted"] == 0
+    assert report["errors"] == [(1, "missing columns: last_name")]
+
+
+def test_import_rejects_duplicate_columns(db):
+    report = import_text(db, "first_name,last_name,Email,email \nAda,Lovelace,a@x.edu,b@x.edu\n")
+    assert report["inserted"] == 0
+    assert report["errors"] == [(1, "duplicate columns: email")]
+
+
+def test_import_reports_non_utf8_upload(login):
+    page = upload(login, "first_name,last_name,email\nJosé,Núñez,jn@example.edu\n".encode("latin-1"))
+    assert college.IMPORT_ENCODING_ERROR in page
+
+    page = upload(login, "first_name,last_name,email\n".encode("utf-16"))
+    assert college.IMPORT_ENCODING_ERROR in page
+
+
+# JSON API
+
+def test_api_requires_login(client):
+    assert client.get("/api/v1/courses").status_code == 401
+
+
+def test_api_etag_round_trip(login, db):
+    client = login("sarah")
+    first = client.get("/api/v1/courses")
+    assert first.status_code == 200
+    etag = first.headers["ETag"]
+
+    unchanged = client.get("/api/v1/courses", headers={"If-None-Match": etag})
+    assert unchanged.status_code == 304
+    assert unchanged.data == b""
+    assert unchanged.headers["ETag"] == etag
+
+    weakened = client.get("/api/v1/courses", headers={"If-None-Match": "W/" + etag})
+    assert weakened.status_code == 304
+
+    db.execute("UPDATE Course SET course_name = 'Renamed' WHERE course_id = 1")
+    db.commit()
+    changed = client.get("/api/v1/courses", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
+
+
+def test_api_etag_is_scoped_to_the_query(login):
+    client = login("sarah")
+    etag = client.get("/api/v1/sections?course_id=1").headers["ETag"]
+    assert client.get("/api/v1/sections?course_id=2", headers={"If-None-Match": etag}).status_code == 200